@@ -1,23 +1,28 @@
 import os
-import httpx
-import random
-import PyPDF2
+import asyncio
 from models import BillData, DischargeSummaryData, IDCardData, OtherDocumentData, ValidationResult, ClaimDecision
-from datetime import datetime
-import io
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import FakeEmbeddings
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_bytes
-from pdf_text_extractor import extract_text_from_pdf
+from typing import Annotated, Optional, Tuple, Union
+from pydantic import Field, TypeAdapter
 from faiss_store import store_text_in_faiss, retrieve_relevant_chunk
+from extraction_context import build_extraction_context
+from llm_client import OPENROUTER_API_KEY, chat, chat_json
+from doc_classifier import classify_locally, record_classification, LOCAL_CLASSIFIER_THRESHOLD
+from metrics import stage, record_fallback
+from claim_validation import validate_claim
 
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL")
-OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL")
+# Bump whenever a prompt changes so cached LLM results are not reused
+PROMPT_VERSION = "5"
+# Retrieval query for the chunk shown to the classifier
+CLASSIFICATION_QUERY = (
+    "bill invoice total amount bill no discharge summary diagnosis date of admission "
+    "date of discharge insurance id card policy number member id validity"
+)
+# Set FUSED_EXTRACTION=1 to classify and extract with a single LLM call
+FUSED_EXTRACTION = os.getenv("FUSED_EXTRACTION", "0") == "1"
+
+_document_adapter = TypeAdapter(Annotated[
+    Union[BillData, DischargeSummaryData, IDCardData, OtherDocumentData],
+    Field(discriminator="type")])
 
 SYSTEM_PROMPT = (
     "You are a highly reliable, detail-oriented assistant for medical insurance claim document processing. "
@@ -33,7 +38,7 @@ SYSTEM_PROMPT = (
     "- Do not provide explanations unless explicitly asked.\n"
     "- Always use the most up-to-date medical and insurance terminology.\n"
     "- When extracting or structuring data, always use the following JSON format as a reference for your output, including only the fields relevant to the document type:\n"
-    "  For a bill: {\\\"type\\\": \\\"bill\\\", \\\"hospital_name\\\": ..., \\\"total_amount\\\": ..., \\\"date_of_service\\\": ...}\n"
+    "  For a bill: {\\\"type\\\": \\\"bill\\\", \\\"hospital_name\\\": ..., \\\"patient_name\\\": ..., \\\"total_amount\\\": ..., \\\"date_of_service\\\": ...}\n"
     "  For a discharge summary: {\\\"type\\\": \\\"discharge_summary\\\", \\\"patient_name\\\": ..., \\\"diagnosis\\\": ..., \\\"admission_date\\\": ..., \\\"discharge_date\\\": ...}\n"
     "  For an id_card: {\\\"type\\\": \\\"id_card\\\", \\\"patient_name\\\": ..., \\\"patient_id\\\": ..., \\\"insurance_provider\\\": ..., \\\"policy_number\\\": ..., \\\"validity_date\\\": ...}\n"
     "  For other: {\\\"type\\\": \\\"other\\\", \\\"content_summary\\\": ...}\n"
@@ -41,44 +46,59 @@ SYSTEM_PROMPT = (
 )
 
 
+def _confident_local_label(text: str) -> Optional[str]:
+    """Local classifier label if it clears the threshold (or no LLM is configured)."""
+    label, confidence = classify_locally(text)
+    if confidence >= LOCAL_CLASSIFIER_THRESHOLD or not OPENROUTER_API_KEY:
+        record_classification("local")
+        return label
+    return None
+
+
 async def classify_document_agent(text: str) -> str:
-    """Classify document type using OpenRouter GPT-4o, with PDF content indexed by LangChain."""
-    if not OPENROUTER_API_KEY:
-        return "other"
-    # Use the new FAISS store module
-    vectorstore = store_text_in_faiss(text, embedding_size=1536)
-    indexed_text = retrieve_relevant_chunk(
-        vectorstore, text, k=1) or text[:2000]
+    """
+    Classify document type with the local keyword classifier, calling
+    OpenRouter GPT-4o only when the local prediction is not confident.
+    """
+    label = _confident_local_label(text)
+    if label is not None:
+        return label
+    record_classification("llm")
+    return await _classify_with_llm(text)
+
+
+def _classification_context(text: str) -> str:
+    """Index the text and return the chunk most relevant to classification."""
+    doc_id = store_text_in_faiss(text)
+    return retrieve_relevant_chunk(doc_id, CLASSIFICATION_QUERY, k=1) or text[:2000]
+
+
+async def _classify_with_llm(text: str) -> str:
+    """
+    Classify document type using OpenRouter GPT-4o, with PDF content retrieved
+    from the local chunk index. Callers record the classification source.
+    """
+    # Indexing embeds and appends to disk, so keep it off the event loop
+    with stage("index"):
+        indexed_text = await asyncio.to_thread(_classification_context, text)
     system_prompt = SYSTEM_PROMPT + \
         f"\n\n--- Indexed PDF Content ---\n{indexed_text}\n--- End ---"
     prompt = (
         "Classify the above medical document as one of: bill, discharge_summary, id_card, other. "
         "Respond with only the type."
     )
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": OPENROUTER_MODEL,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 10,
-        "temperature": 0
-    }
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(OPENROUTER_API_URL, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-            result = response.json()
-            content = result["choices"][0]["message"]["content"].strip(
-            ).lower()
-            if content in ["bill", "discharge_summary", "id_card", "other"]:
-                return content
-            return "other"
-    except Exception:
+        content = (await chat(messages, max_tokens=10, timeout=30)).lower()
+        if content in ["bill", "discharge_summary", "id_card", "other"]:
+            return content
+        record_fallback("classify", "invalid_label")
+        return "other"
+    except Exception as e:
+        record_fallback("classify", e)
         return "other"
 
 
@@ -86,83 +106,108 @@ async def extract_data_agent(text: str, doc_type: str):
     """Extract structured data from the PDF text using the LLM only."""
     if not OPENROUTER_API_KEY:
         # Fallback: return minimal data if no LLM available
+        record_fallback("extract", "no_api_key")
         return OtherDocumentData(document_title=None, content_summary=text[:100])
+    # Send only the chunks relevant to this type's fields, within the token budget
+    context, _ = await asyncio.to_thread(build_extraction_context, text, doc_type)
     # Build a prompt for extraction based on doc_type
     if doc_type == "bill":
         user_prompt = (
             "Extract ONLY the following fields from the medical bill document below as a JSON object. Use this format (replace values with those from the document): "
-            '{"type": "bill", "hospital_name": "HOSPITAL_NAME", "total_amount": 12345, "date_of_service": "2024-04-10"}'
+            '{"type": "bill", "hospital_name": "HOSPITAL_NAME", "patient_name": "PATIENT_NAME", "total_amount": 12345, "date_of_service": "2024-04-10"}'
             " If a field is missing, use null. Do not include extra fields or explanations.\n\nDocument:\n" +
-            text[:2000]
+            context
         )
     elif doc_type == "discharge_summary":
         user_prompt = (
             "Extract ONLY the following fields from the discharge summary below as a JSON object. Use this format (replace values with those from the document): "
             '{"type": "discharge_summary", "patient_name": "PATIENT_NAME", "diagnosis": "DIAGNOSIS", "admission_date": "2024-04-01", "discharge_date": "2024-04-10"}'
             " If a field is missing, use null. Do not include extra fields or explanations.\n\nDocument:\n" +
-            text[:2000]
+            context
         )
     elif doc_type == "id_card":
         user_prompt = (
             "Extract ONLY the following fields from the insurance ID card below as a JSON object. Use this format (replace values with those from the document): "
             '{"type": "id_card", "patient_name": "PATIENT_NAME", "patient_id": "ID", "insurance_provider": "PROVIDER", "policy_number": "POLICY", "validity_date": "2024-12-31"}'
             " If a field is missing, use null. Do not include extra fields or explanations.\n\nDocument:\n" +
-            text[:2000]
+            context
         )
     else:
         user_prompt = (
             "Summarize the content of the following document in at least 100 words. Respond with a JSON object: {\"type\": \"other\", \"content_summary\": \"SUMMARY\"}. Do not include extra fields or explanations.\n\nDocument:\n" +
-            text[:2000]
+            context
         )
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": OPENROUTER_MODEL,
-        "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt}
-        ],
-        "max_tokens": 512,
-        "temperature": 0
-    }
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(OPENROUTER_API_URL, headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            result = response.json()
-            content = result["choices"][0]["message"]["content"].strip()
-            import json as _json
-            if doc_type == "bill":
-                parsed = _json.loads(content)
-                return BillData(**parsed)
-            elif doc_type == "discharge_summary":
-                parsed = _json.loads(content)
-                return DischargeSummaryData(**parsed)
-            elif doc_type == "id_card":
-                parsed = _json.loads(content)
-                return IDCardData(**parsed)
-            else:
-                return OtherDocumentData(document_title=None, content_summary=content)
+        if doc_type == "bill":
+            parsed = await chat_json(messages, max_tokens=512)
+            return BillData(**parsed)
+        elif doc_type == "discharge_summary":
+            parsed = await chat_json(messages, max_tokens=512)
+            return DischargeSummaryData(**parsed)
+        elif doc_type == "id_card":
+            parsed = await chat_json(messages, max_tokens=512)
+            return IDCardData(**parsed)
+        else:
+            content = await chat(messages, max_tokens=512)
+            return OtherDocumentData(document_title=None, content_summary=content)
     except Exception as e:
         # Fallback: return minimal data if LLM or parsing fails
+        record_fallback("extract", e)
         return OtherDocumentData(document_title=None, content_summary=text[:100])
 
 
+async def classify_and_extract_agent(text: str) -> Tuple[str, Union[BillData, DischargeSummaryData, IDCardData, OtherDocumentData]]:
+    """
+    Classify the document and extract its fields with a single LLM call.
+    A confident local classification skips straight to extract_data_agent.
+    The reply is validated against the document models; if the call or the
+    validation fails, falls back to classifying and extracting separately.
+    """
+    label = _confident_local_label(text)
+    if label is not None:
+        return label, await extract_data_agent(text, label)
+    record_classification("llm")
+    context, _ = await asyncio.to_thread(build_extraction_context, text)
+    user_prompt = (
+        "Classify the medical document below as one of: bill, discharge_summary, id_card, other, "
+        "and extract the fields for that type. Respond with a single JSON object using exactly the "
+        "format given for that type in your instructions, with the \"type\" field set to the class. "
+        "If a field is missing, use null. Do not include extra fields or explanations.\n\nDocument:\n" +
+        context
+    )
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+    try:
+        parsed = await chat_json(messages, max_tokens=512)
+        extracted = _document_adapter.validate_python(parsed)
+        return extracted.type, extracted
+    except Exception as e:
+        record_fallback("classify_and_extract", e)
+    doc_type = await _classify_with_llm(text)
+    return doc_type, await extract_data_agent(text, doc_type)
+
+
 async def validate_claim_agent(extracted_data):
-    """Validation agent: checks for required fields and values."""
+    """
+    Validation agent: runs the deterministic cross-document rules and reports
+    each discrepancy as an error on the documents it involves.
+    """
+    discrepancies = validate_claim(extracted_data)
     results = []
     for item in extracted_data:
-        errors = []
+        doc_type = getattr(item, 'type', None)
+        errors = [d["detail"]
+                  for d in discrepancies if doc_type in d["documents"]]
         warnings = []
-        # Bill validation
-        if hasattr(item, 'type') and getattr(item, 'type', None) == 'bill':
-            if getattr(item, 'total_amount', 0) <= 0:
-                errors.append("Total amount must be greater than 0.")
-            if getattr(item, 'patient_name', '').strip().lower() in ["", "tbd", "unknown"]:
-                errors.append("Patient name is missing or invalid.")
-        # Add more rules for other types if needed
+        # Bills rarely carry the patient name; a placeholder one is still suspect
+        if doc_type == 'bill' and (getattr(item, 'patient_name', None) or '').strip().lower() in ["tbd", "unknown"]:
+            warnings.append("Patient name on the bill is a placeholder.")
         is_valid = len(errors) == 0
         results.append(ValidationResult(is_valid=is_valid,
                        errors=errors, warnings=warnings))
@@ -0,0 +1,335 @@
+"""
+Offline benchmark for the claim pipeline.
+
+Runs the real pdf_text_extractor, faiss_store, agents and /process-claim paths
+against the PDFs in documents/ plus generated synthetic PDFs, with a local stub
+LLM server standing in for OpenRouter. Reports per-stage latency percentiles,
+claims/sec per concurrency level and peak memory, and saves JSON results that
+can be compared against a baseline run. Timing passes run untraced; the Python
+heap peak comes from a separate tracemalloc pass over the stages afterwards.
+
+    python benchmark.py --concurrency 1 4 8 --rounds 2 --out bench.json
+    python benchmark.py --baseline bench.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from stub_llm_server import start_stub_server
+
+_BILL_LINES = [
+    "CITY CARE HOSPITAL", "Final Bill", "Bill No: B-{n}   Bill Date: 12/03/2025",
+    "Patient Name: John Sample   UHID: U{n}", "Room Charges        3 Day(s)   7,500.00",
+    "Pharmacy                          4,210.50", "Investigations                    2,900.00",
+    "Total Amount: 14,610.50", "Net Payable: 14,610.50",
+]
+_DISCHARGE_LINES = [
+    "CITY CARE HOSPITAL", "DISCHARGE SUMMARY", "Patient Name: John Sample   UHID: U{n}",
+    "Date of Admission: 09/03/2025   Date of Discharge: 12/03/2025",
+    "Final Diagnosis: Acute gastroenteritis with dehydration",
+    "Course in Hospital: Treated with IV fluids and antibiotics, improved.",
+    "Condition at Discharge: Stable. Follow-up after one week.",
+]
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+    return {"count": len(ordered), "p50_ms": pick(0.50), "p90_ms": pick(0.90),
+            "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_text_pdf(pages: List[List[str]]) -> bytes:
+    """Minimal digital PDF with a Helvetica text layer, one list of lines per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 11 Tf 14 TL 50 780 Td " + \
+            " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def make_scanned_pdf(pages: List[List[str]], dpi: int = 150) -> bytes:
+    """Image-only PDF (no text layer) with the lines rendered onto each page."""
+    from PIL import Image, ImageDraw
+    images = []
+    for lines in pages:
+        img = Image.new("L", (int(8.27 * dpi), int(11.69 * dpi)), 255)
+        draw = ImageDraw.Draw(img)
+        for i, line in enumerate(lines):
+            draw.text((dpi // 2, dpi // 2 + i * dpi // 4), line, fill=0)
+        images.append(img)
+    out = io.BytesIO()
+    images[0].save(out, format="PDF", save_all=True,
+                   append_images=images[1:], resolution=dpi)
+    return out.getvalue()
+
+
+def make_mixed_pdf(pages: List[List[str]]) -> bytes:
+    """Alternate digital and scanned pages in one document."""
+    from PyPDF2 import PdfReader, PdfWriter
+    writer = PdfWriter()
+    for i, lines in enumerate(pages):
+        maker = make_text_pdf if i % 2 == 0 else make_scanned_pdf
+        writer.add_page(PdfReader(io.BytesIO(maker([lines]))).pages[0])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def build_corpus(directory: Path, docs_dir: Path, many_pages: int, with_ocr: bool) -> List[Tuple[str, Path]]:
+    """Write the synthetic PDFs and list them with the sample PDFs. Returns (kind, path) pairs."""
+    directory.mkdir(parents=True, exist_ok=True)
+    bill = [[line.format(n=1) for line in _BILL_LINES]]
+    discharge = [[line.format(n=1) for line in _DISCHARGE_LINES]]
+    synthetic = {
+        "digital_bill": make_text_pdf(bill),
+        "digital_discharge": make_text_pdf(discharge),
+        "many_page": make_text_pdf([[line.format(n=i) for line in _BILL_LINES] for i in range(many_pages)]),
+    }
+    if with_ocr:
+        synthetic["scanned_discharge"] = make_scanned_pdf(discharge)
+        synthetic["mixed"] = make_mixed_pdf(bill + discharge)
+    corpus = []
+    for kind, data in synthetic.items():
+        path = directory / f"{kind}.pdf"
+        path.write_bytes(data)
+        corpus.append((kind, path))
+    for sample in sorted(docs_dir.glob("*.pdf")):
+        corpus.append(("sample", sample))
+    return corpus
+
+
+async def bench_stages(corpus: List[Tuple[str, Path]], dpi: int, with_ocr: bool) -> Dict[str, dict]:
+    """
+    Time each pipeline stage per document by calling the modules directly.
+    Scanned pages are skipped when poppler/tesseract are unavailable.
+    """
+    from pdf_text_extractor import scan_text_layer, ocr_page
+    from faiss_store import store_text_in_faiss
+    from extraction_context import build_extraction_context
+    from agents import classify_document_agent, extract_data_agent
+    from llm_client import close_llm_client
+    samples: Dict[str, List[float]] = {}
+
+    def record(stage: str, started: float):
+        samples.setdefault(stage, []).append(time.perf_counter() - started)
+
+    for kind, path in corpus:
+        started = time.perf_counter()
+        pages, needs_ocr = scan_text_layer(str(path))
+        record("text_layer", started)
+        for i in needs_ocr if with_ocr else []:
+            started = time.perf_counter()
+            pages[i] = ocr_page(str(path), i, dpi)
+            record("ocr_page", started)
+        text = "\n".join(pages).strip()
+        if not text:
+            continue
+        started = time.perf_counter()
+        store_text_in_faiss(text)
+        record("index_add", started)
+        started = time.perf_counter()
+        build_extraction_context(text)
+        record("context_build", started)
+        started = time.perf_counter()
+        doc_type = await classify_document_agent(text)
+        record("classify", started)
+        started = time.perf_counter()
+        await extract_data_agent(text, doc_type)
+        record("extract", started)
+    # The shared client is bound to this event loop
+    await close_llm_client()
+    return {stage: _percentiles(values) for stage, values in samples.items()}
+
+
+async def bench_end_to_end(claims: List[List[Path]], concurrency_levels: List[int],
+                           rounds: int) -> Dict[str, dict]:
+    """Drive /process-claim through ASGI at each concurrency level."""
+    import httpx
+    from main import app
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            for level in concurrency_levels:
+                slots = asyncio.Semaphore(level)
+                latencies = []
+                statuses: Dict[int, int] = {}
+
+                async def one(paths: List[Path]):
+                    async with slots:
+                        files = [("files", (p.name, p.read_bytes(), "application/pdf"))
+                                 for p in paths]
+                        started = time.perf_counter()
+                        response = await client.post("/process-claim", files=files)
+                        latencies.append(time.perf_counter() - started)
+                        statuses[response.status_code] = statuses.get(
+                            response.status_code, 0) + 1
+
+                work = [claim for _ in range(rounds) for claim in claims]
+                started = time.perf_counter()
+                await asyncio.gather(*[one(paths) for paths in work])
+                elapsed = time.perf_counter() - started
+                results[str(level)] = {
+                    "claims": len(work),
+                    "claims_per_sec": round(len(work) / elapsed, 3),
+                    "latency": _percentiles(latencies),
+                    "status_codes": statuses,
+                }
+    return results
+
+
+def _peak_rss() -> dict:
+    usage_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "max_rss_mb": round(usage_self * scale / 2 ** 20, 1),
+        "max_child_rss_mb": round(usage_children * scale / 2 ** 20, 1),
+    }
+
+
+def _heap_peak_mb(corpus: List[Tuple[str, Path]], dpi: int, with_ocr: bool) -> float:
+    """
+    Peak Python heap of one pass over the stages. Run separately because
+    tracemalloc slows every allocation and would distort the timings.
+    """
+    tracemalloc.start()
+    try:
+        asyncio.run(bench_stages(corpus, dpi, with_ocr))
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def compare(results: dict, baseline: dict):
+    """Print the relative change of every numeric metric present in both runs."""
+    def flatten(data, prefix=""):
+        for key, value in data.items():
+            name = f"{prefix}{key}"
+            if isinstance(value, dict):
+                yield from flatten(value, name + ".")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield name, value
+    old = dict(flatten(baseline.get("metrics", {})))
+    print("\n[Bench] Change versus baseline:")
+    for name, value in flatten(results["metrics"]):
+        if name in old and old[name]:
+            delta = (value - old[name]) / old[name] * 100
+            print(f"  {name:<55} {old[name]:>10} -> {value:<10} ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs-dir", default="documents")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--rounds", type=int, default=2,
+                        help="times each claim is submitted per concurrency level")
+    parser.add_argument("--many-pages", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    args = parser.parse_args()
+    # Read the baseline up front: --out may point at the same file
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    workdir = Path(tempfile.mkdtemp(prefix="claim-bench-"))
+    _, stub_url = start_stub_server(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                    error_rate=args.error_rate)
+    # Configure the app before its modules read the environment
+    os.environ.update({
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENROUTER_API_URL": stub_url,
+        "OPENROUTER_MODEL": "stub",
+        "CACHE_ENABLED": "0",
+        "VECTOR_STORE_DIR": str(workdir / "vector_store"),
+        "BATCH_DB_PATH": str(workdir / "batch" / "jobs.sqlite3"),
+        "DUPLICATE_DB_PATH": str(workdir / "duplicates" / "signatures.sqlite3"),
+        "UPLOAD_SPOOL_DIR": str(workdir / "spool"),
+    })
+    with_ocr = bool(shutil.which("pdftoppm") and shutil.which("tesseract"))
+    if not with_ocr:
+        print("[Bench] poppler/tesseract not found; skipping scanned and mixed PDFs")
+
+    try:
+        corpus = build_corpus(workdir / "pdfs", Path(args.docs_dir),
+                              args.many_pages, with_ocr)
+        from pdf_text_extractor import OCR_DPI
+        stages = asyncio.run(bench_stages(corpus, OCR_DPI, with_ocr))
+        by_kind = {kind: path for kind, path in corpus}
+        claims = [[by_kind["digital_bill"], by_kind["digital_discharge"]],
+                  [by_kind["many_page"], by_kind["digital_discharge"]]]
+        if with_ocr:
+            claims.append([by_kind["mixed"], by_kind["scanned_discharge"]])
+        claims += [[path] for kind, path in corpus if kind == "sample"]
+        end_to_end = asyncio.run(bench_end_to_end(
+            claims, args.concurrency, args.rounds))
+        # RSS high-water marks first, before tracing inflates them
+        memory = _peak_rss()
+        memory["python_heap_peak_mb"] = _heap_peak_mb(corpus, OCR_DPI, with_ocr)
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": {"python": platform.python_version(), "cpus": os.cpu_count(),
+                            "ocr_available": with_ocr, "documents": len(corpus)},
+            "config": vars(args),
+            "metrics": {"stages": stages, "end_to_end": end_to_end, "memory": memory},
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results["metrics"], indent=2))
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[Bench] Results written to {args.out}")
+    if baseline is not None:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
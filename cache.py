@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Set CACHE_ENABLED=0 to turn the cache off entirely
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+# Entries kept in the in-process LRU tier
+CACHE_MEMORY_ITEMS = int(os.getenv("CACHE_MEMORY_ITEMS", "1024"))
+# SQLite file backing the on-disk tier
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache/claim_cache.sqlite3")
+# Entries older than this are treated as misses and evicted, in seconds
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Upper bound on the size of cached values on disk, in megabytes
+CACHE_MAX_DISK_MB = float(os.getenv("CACHE_MAX_DISK_MB", "512"))
+# Seconds between sweeps of expired rows from the disk tier, done on write
+CACHE_PURGE_INTERVAL = float(os.getenv("CACHE_PURGE_INTERVAL", "3600"))
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, tuple]" = OrderedDict()
+_db: Optional[sqlite3.Connection] = None
+_disk_bytes = 0
+_purged_at = 0.0
+# Disk hits whose accessed_at has not been written yet, flushed in batches
+_touched: Dict[str, float] = {}
+_TOUCH_BATCH = 256
+_stats = {}
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 hex digest used to address cached results by PDF content."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(stage: str, digest: str, *parts) -> str:
+    """Build a cache key from the stage, content digest and any versioning parts."""
+    return ":".join([stage, digest] + [str(p) for p in parts])
+
+
+def _count(stage: str, outcome: str):
+    counts = _stats.setdefault(
+        stage, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+    counts[outcome] += 1
+
+
+def _get_db() -> sqlite3.Connection:
+    global _db, _disk_bytes
+    if _db is None:
+        os.makedirs(os.path.dirname(CACHE_DB_PATH) or ".", exist_ok=True)
+        _db = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute("PRAGMA synchronous=NORMAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        _db.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed_at)")
+        _db.execute(
+            "CREATE INDEX IF NOT EXISTS cache_created ON cache(created_at)")
+        _disk_bytes = _db.execute(
+            "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache").fetchone()[0]
+        _purge_expired(_db, time.time())
+        _db.commit()
+    return _db
+
+
+def _purge_expired(db: sqlite3.Connection, now: float):
+    """Delete rows past CACHE_TTL_SECONDS from the disk tier."""
+    global _disk_bytes, _purged_at
+    cutoff = now - CACHE_TTL_SECONDS
+    expired = db.execute(
+        "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache WHERE created_at < ?",
+        (cutoff,)).fetchone()[0]
+    if expired:
+        db.execute("DELETE FROM cache WHERE created_at < ?", (cutoff,))
+        _disk_bytes -= expired
+    _purged_at = now
+
+
+def _remember(key: str, value: Any, created_at: float):
+    _memory[key] = (value, created_at)
+    _memory.move_to_end(key)
+    while len(_memory) > CACHE_MEMORY_ITEMS:
+        _memory.popitem(last=False)
+
+
+def _flush_touched(db: sqlite3.Connection):
+    """Write the pending accessed_at updates of disk hits (the caller commits)."""
+    if _touched:
+        db.executemany("UPDATE cache SET accessed_at = ? WHERE key = ?",
+                       [(at, key) for key, at in _touched.items()])
+        _touched.clear()
+
+
+def _evict_disk(db: sqlite3.Connection):
+    """Drop least recently used rows until the disk tier fits CACHE_MAX_DISK_MB."""
+    global _disk_bytes
+    limit = CACHE_MAX_DISK_MB * 1024 * 1024
+    if _disk_bytes > limit:
+        _flush_touched(db)
+    while _disk_bytes > limit:
+        rows = db.execute(
+            "SELECT key, LENGTH(value) FROM cache ORDER BY accessed_at LIMIT 100").fetchall()
+        if not rows:
+            _disk_bytes = 0
+            break
+        db.executemany("DELETE FROM cache WHERE key = ?",
+                       [(k,) for k, _ in rows])
+        _disk_bytes -= sum(size for _, size in rows)
+
+
+def cache_get(stage: str, key: str) -> Optional[Any]:
+    """
+    Look a value up in the memory tier, then the disk tier.
+    Returns None on a miss or when the entry has expired.
+    """
+    if not CACHE_ENABLED:
+        return None
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None and now - entry[1] < CACHE_TTL_SECONDS:
+            _memory.move_to_end(key)
+            _count(stage, "memory_hits")
+            return entry[0]
+        db = _get_db()
+        row = db.execute(
+            "SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] >= CACHE_TTL_SECONDS:
+            _memory.pop(key, None)
+            _count(stage, "misses")
+            return None
+        # Recency only steers eviction, so it is written in batches, not per hit
+        _touched[key] = now
+        if len(_touched) >= _TOUCH_BATCH:
+            _flush_touched(db)
+            db.commit()
+        value = json.loads(row[0])
+        _remember(key, value, row[1])
+        _count(stage, "disk_hits")
+        return value
+
+
+def cache_set(stage: str, key: str, value: Any):
+    """Store a JSON-serializable value in both tiers."""
+    global _disk_bytes
+    if not CACHE_ENABLED:
+        return
+    now = time.time()
+    encoded = json.dumps(value)
+    with _lock:
+        _remember(key, value, now)
+        db = _get_db()
+        old = db.execute(
+            "SELECT LENGTH(value) FROM cache WHERE key = ?", (key,)).fetchone()
+        db.execute(
+            "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, encoded, now, now))
+        _touched.pop(key, None)
+        _disk_bytes += len(encoded) - (old[0] if old else 0)
+        # Expired rows are only skipped on read, so sweep them out periodically
+        if now - _purged_at >= CACHE_PURGE_INTERVAL:
+            _purge_expired(db, now)
+        _evict_disk(db)
+        db.commit()
+
+
+async def cache_get_async(stage: str, key: str) -> Optional[Any]:
+    """cache_get run in a worker thread, keeping SQLite I/O off the event loop."""
+    if not CACHE_ENABLED:
+        return None
+    return await asyncio.to_thread(cache_get, stage, key)
+
+
+async def cache_set_async(stage: str, key: str, value: Any):
+    """cache_set run in a worker thread, keeping SQLite I/O off the event loop."""
+    if CACHE_ENABLED:
+        await asyncio.to_thread(cache_set, stage, key, value)
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters per stage plus the current size of each tier."""
+    with _lock:
+        return {
+            "enabled": CACHE_ENABLED,
+            "memory_items": len(_memory),
+            "disk_bytes": _disk_bytes,
+            "stages": {stage: dict(counts) for stage, counts in _stats.items()}
+        }
+
+
+def open_cache():
+    """Open the on-disk tier and expire stale entries ahead of the first request."""
+    if CACHE_ENABLED:
+        with _lock:
+            _get_db()
+
+
+def close_cache():
+    """Close the on-disk tier (called from the FastAPI lifespan)."""
+    global _db
+    with _lock:
+        if _db is not None:
+            _flush_touched(_db)
+            _db.commit()
+            _db.close()
+            _db = None
@@ -0,0 +1,268 @@
+import os
+import re
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+# Days a bill may be dated after discharge (final bills are often issued later)
+VALIDATION_BILL_GRACE_DAYS = int(os.getenv("VALIDATION_BILL_GRACE_DAYS", "3"))
+# Claims whose bills add up to more than this are flagged
+VALIDATION_MAX_CLAIM_AMOUNT = float(
+    os.getenv("VALIDATION_MAX_CLAIM_AMOUNT", "1000000"))
+# Document types every claim needs
+REQUIRED_DOCUMENTS = ("bill", "discharge_summary")
+
+_TITLES_RE = re.compile(
+    r"\b(mr|mrs|ms|miss|mstr|master|dr|baby|smt|shri|sri|late)\b\.?")
+_NON_LETTERS_RE = re.compile(r"[^a-z ]+")
+_NO_DAY = np.iinfo(np.int64).max
+
+
+def _field(doc: dict, *names):
+    for name in names:
+        value = doc.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+@lru_cache(maxsize=65536)
+def _name_keys(name) -> Tuple[str, str, bool]:
+    """
+    Comparison keys for a person's name: all tokens sorted (word order and
+    titles ignored), first initial + surname, and whether the first name is
+    only an initial (so "J. Doe" matches "John Doe" but "Jane Doe" does not).
+    """
+    if not isinstance(name, str):
+        return "", "", False
+    tokens = _NON_LETTERS_RE.sub(" ", _TITLES_RE.sub(" ", name.lower())).split()
+    if not tokens:
+        return "", "", False
+    return " ".join(sorted(tokens)), f"{tokens[0][0]} {tokens[-1]}", len(tokens[0]) == 1
+
+
+def _to_days(values: List[Optional[str]]) -> np.ndarray:
+    """ISO dates (or datetimes) as int64 day numbers; missing or unparsable is _NO_DAY."""
+    texts = ["NaT" if value is None else str(value)[:10] for value in values]
+    try:
+        dates = np.array(texts, dtype="datetime64[D]")
+    except ValueError:
+        # Parse one by one so a single malformed date only loses itself
+        dates = np.array([_parse_day(text) for text in texts], dtype="datetime64[D]")
+    days = dates.astype(np.int64)
+    days[np.isnat(dates)] = _NO_DAY
+    return days
+
+
+def _parse_day(text: str) -> np.datetime64:
+    try:
+        return np.datetime64(text, "D")
+    except ValueError:
+        return np.datetime64("NaT", "D")
+
+
+def _to_amounts(values: list) -> np.ndarray:
+    amounts = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+        try:
+            amounts[i] = float(str(value).replace(",", "")) if value is not None else np.nan
+        except ValueError:
+            pass
+    return amounts
+
+
+def _day_str(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+class ClaimTable:
+    """
+    Extracted fields of many claims as column arrays. Discharge summary and ID
+    card columns have one row per claim (the first document of that type);
+    bill columns have one row per bill, with bill_claim giving its claim row.
+    """
+
+    def __init__(self, claims: Sequence[Sequence]):
+        self.size = len(claims)
+        discharge: List[dict] = [{}] * self.size
+        id_card: List[dict] = [{}] * self.size
+        bills: List[dict] = []
+        bill_claim: List[int] = []
+        for row, documents in enumerate(claims):
+            for doc in documents:
+                if isinstance(doc, BaseModel):
+                    doc = doc.model_dump(mode="json")
+                doc_type = doc.get("type")
+                if doc_type == "bill":
+                    bills.append(doc)
+                    bill_claim.append(row)
+                elif doc_type == "discharge_summary" and not discharge[row]:
+                    discharge[row] = doc
+                elif doc_type == "id_card" and not id_card[row]:
+                    id_card[row] = doc
+        self.admission = _to_days([_field(d, "admission_date") for d in discharge])
+        self.discharge = _to_days([_field(d, "discharge_date") for d in discharge])
+        self.validity = _to_days([_field(d, "validity_date") for d in id_card])
+        self.discharge_names = [_field(d, "patient_name") for d in discharge]
+        self.id_names = [_field(d, "patient_name") for d in id_card]
+        self.discharge_keys = self._keys(self.discharge_names)
+        self.id_keys = self._keys(self.id_names)
+        self.bill_claim = np.array(bill_claim, dtype=np.int64)
+        self.bill_date = _to_days([_field(b, "date_of_service", "bill_date") for b in bills])
+        self.bill_amount = _to_amounts([_field(b, "total_amount") for b in bills])
+        self.bill_names = [_field(b, "patient_name") for b in bills]
+        self.bill_keys = self._keys(self.bill_names)
+
+    @staticmethod
+    def _keys(names: list) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        keys = [_name_keys(name) for name in names]
+        full = np.array([k[0] for k in keys], dtype=object)
+        short = np.array([k[1] for k in keys], dtype=object)
+        initial = np.array([k[2] for k in keys], dtype=bool)
+        return full, short, initial
+
+
+def _names_differ(a: Tuple[np.ndarray, ...], b: Tuple[np.ndarray, ...]) -> np.ndarray:
+    """
+    Rows where both names are present and differ. The initial + surname key
+    only counts when one side's first name is just an initial.
+    """
+    (a_full, a_short, a_initial), (b_full, b_short, b_initial) = a, b
+    present = (a_full != "") & (b_full != "")
+    abbreviated = (a_initial | b_initial) & (a_short == b_short)
+    return present & (a_full != b_full) & ~abbreviated
+
+
+def validate_table(table: ClaimTable) -> List[List[dict]]:
+    """Evaluate every rule over the whole table at once. Returns the discrepancies of each claim."""
+    results: List[List[dict]] = [[] for _ in range(table.size)]
+
+    def flag(rows, rule: str, documents: List[str], detail):
+        for i, row in enumerate(rows):
+            results[row].append(
+                {"rule": rule, "documents": documents, "detail": detail(i)})
+
+    # Claim-level rules
+    rows = np.flatnonzero(_names_differ(table.discharge_keys, table.id_keys))
+    flag(rows, "name_mismatch", ["discharge_summary", "id_card"],
+         lambda i: f"Patient name '{table.discharge_names[rows[i]]}' on the discharge summary "
+                   f"does not match '{table.id_names[rows[i]]}' on the ID card")
+
+    has_stay = (table.admission != _NO_DAY) & (table.discharge != _NO_DAY)
+    rows = np.flatnonzero(has_stay & (table.discharge < table.admission))
+    flag(rows, "discharge_before_admission", ["discharge_summary"],
+         lambda i: f"Discharge date {_day_str(table.discharge[rows[i]])} is before "
+                   f"admission date {_day_str(table.admission[rows[i]])}")
+
+    # Bill-level rules, joined to their claim's columns through bill_claim
+    claim = table.bill_claim
+    for other, keys, names in (("discharge_summary", table.discharge_keys, table.discharge_names),
+                               ("id_card", table.id_keys, table.id_names)):
+        bills = np.flatnonzero(_names_differ(
+            table.bill_keys, tuple(column[claim] for column in keys)))
+        flag(claim[bills], "name_mismatch", ["bill", other],
+             lambda i: f"Patient name '{table.bill_names[bills[i]]}' on the bill does not match "
+                       f"'{names[claim[bills[i]]]}' on the {other.replace('_', ' ')}")
+
+    has_date = table.bill_date != _NO_DAY
+    admission, discharge = table.admission[claim], table.discharge[claim]
+    outside = has_date & has_stay[claim] & (
+        (table.bill_date < admission) | (table.bill_date > discharge + VALIDATION_BILL_GRACE_DAYS))
+    bills = np.flatnonzero(outside)
+    flag(claim[bills], "bill_date_outside_stay", ["bill", "discharge_summary"],
+         lambda i: f"Bill date {_day_str(table.bill_date[bills[i]])} is outside the stay "
+                   f"{_day_str(admission[bills[i]])} to {_day_str(discharge[bills[i]])}")
+
+    bills = np.flatnonzero(table.bill_amount <= 0)
+    flag(claim[bills], "non_positive_amount", ["bill"],
+         lambda i: f"Bill total {table.bill_amount[bills[i]]:,.2f} is not positive")
+
+    # Policy validity at the date of service: the earliest bill date, else admission
+    earliest = np.full(table.size, _NO_DAY, dtype=np.int64)
+    np.minimum.at(earliest, claim[has_date], table.bill_date[has_date])
+    service = np.where(earliest != _NO_DAY, earliest, table.admission)
+    rows = np.flatnonzero((table.validity != _NO_DAY) & (service != _NO_DAY)
+                          & (table.validity < service))
+    flag(rows, "policy_expired", ["id_card"],
+         lambda i: f"Policy valid until {_day_str(table.validity[rows[i]])}, "
+                   f"before the date of service {_day_str(service[rows[i]])}")
+
+    totals = np.bincount(claim, weights=np.nan_to_num(table.bill_amount),
+                         minlength=table.size)
+    rows = np.flatnonzero(totals > VALIDATION_MAX_CLAIM_AMOUNT)
+    flag(rows, "amount_over_limit", ["bill"],
+         lambda i: f"Billed total {totals[rows[i]]:,.2f} exceeds the {VALIDATION_MAX_CLAIM_AMOUNT:,.2f} limit")
+    return results
+
+
+def validate_claims(claims: Sequence[Sequence]) -> List[List[dict]]:
+    """Discrepancies for each claim, given each claim's extracted documents (dicts or models)."""
+    return validate_table(ClaimTable(claims))
+
+
+def validate_claim(documents: Sequence) -> List[dict]:
+    """Cross-document discrepancies of a single claim."""
+    return validate_claims([documents])[0]
+
+
+def _duplicates(documents: Sequence[dict]) -> List[dict]:
+    """Flatten each document's near-duplicates in other claims (see duplicate_index)."""
+    return [{"document": index, "type": doc["type"], "matched_claim": match["claim_id"],
+             "matched_filename": match["filename"], "similarity": match["similarity"]}
+            for index, doc in enumerate(documents)
+            for match in doc.get("duplicate_of", [])]
+
+
+def claim_verdict(documents: Sequence[dict], discrepancies: Optional[List[dict]] = None) -> dict:
+    """
+    Validation block and claim decision for a claim's document dicts.
+    Near-duplicates found in other claims are reported but do not change the decision.
+    """
+    if discrepancies is None:
+        discrepancies = validate_claim(documents)
+    doc_types_found = {doc["type"] for doc in documents if doc["type"] != "error"}
+    missing_documents = [t for t in REQUIRED_DOCUMENTS if t not in doc_types_found]
+    if not missing_documents and not discrepancies:
+        status = "approved"
+        reason = "All required documents present and data is consistent"
+    else:
+        status = "rejected"
+        reason = "Missing required documents or found discrepancies"
+    return {
+        "validation": {
+            "missing_documents": missing_documents,
+            "discrepancies": discrepancies,
+            "duplicates": _duplicates(documents)
+        },
+        "claim_decision": {
+            "status": status,
+            "reason": reason
+        }
+    }
+
+
+def revalidate_completed_jobs(batch_size: int = 5000) -> Dict[str, float]:
+    """
+    Re-run validation over the results of every completed batch job, a batch
+    of claims at a time, and store the updated verdicts.
+    """
+    from job_queue import completed_results, update_results
+    started = time.perf_counter()
+    claims = changed = flagged = 0
+    for batch in completed_results(batch_size):
+        all_documents = [result.get("documents", []) for _, result in batch]
+        updates = []
+        for (job_id, result), documents, discrepancies in zip(
+                batch, all_documents, validate_claims(all_documents)):
+            verdict = claim_verdict(documents, discrepancies)
+            flagged += bool(discrepancies)
+            if {k: result.get(k) for k in verdict} != verdict:
+                updates.append((job_id, {**result, **verdict}))
+        update_results(updates)
+        claims += len(batch)
+        changed += len(updates)
+    return {"claims": claims, "with_discrepancies": flagged, "updated": changed,
+            "seconds": round(time.perf_counter() - started, 3)}
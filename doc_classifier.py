@@ -0,0 +1,97 @@
+import os
+import re
+from typing import Tuple
+
+# Local predictions at or above this confidence skip the LLM
+LOCAL_CLASSIFIER_THRESHOLD = float(
+    os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.75"))
+# Only the start of the document is scored; the first pages identify its type
+LOCAL_CLASSIFIER_CHARS = int(os.getenv("LOCAL_CLASSIFIER_CHARS", "3000"))
+# Score at which a clear winner is considered fully confident
+_FULL_SCORE = 6.0
+
+# (pattern, weight) per document type; each pattern counts once per document
+_RULES = {
+    "bill": [
+        (r"\btotal\s+(bill\s+)?amount\b", 3),
+        (r"\bbill\s*(no|number|#)\b", 3),
+        (r"\b((final|interim|itemi[sz]ed|ip)\s+bill|bill\s+of\s+supply)\b", 3),
+        (r"\b(tax\s+)?invoice\b", 2),
+        (r"\bnet\s+(amount|payable)\b", 2),
+        (r"\bamount\s+(paid|due|payable|received)\b", 2),
+        (r"\b(receipt|advance)\s*(no|number)\b", 1),
+        (r"\b(qty|quantity|unit\s+price|rate)\b", 1),
+        (r"\bgst(in)?\b", 1),
+    ],
+    "discharge_summary": [
+        (r"\bdischarge\s+summary\b", 4),
+        (r"\bdate\s+of\s+discharge\b", 3),
+        (r"\b(final\s+|provisional\s+)?diagnosis\b", 2),
+        (r"\bdate\s+of\s+admission\b", 2),
+        (r"\bcourse\s+in\s+(the\s+)?hospital\b", 2),
+        (r"\b(chief\s+complaints?|history\s+of\s+present\s+illness)\b", 2),
+        (r"\b(condition\s+at\s+discharge|discharge\s+advice|follow[\s-]?up)\b", 1),
+    ],
+    "id_card": [
+        (r"\bpolicy\s*(no|number|#)\b", 3),
+        (r"\b(member(ship)?\s*(id|no|number)|uhid)\b", 2),
+        (r"\b(health|insurance|e-?|id)\s*card\b", 2),
+        (r"\b(valid\s*(till|upto|up\s+to|from|until)|validity)\b", 2),
+        (r"\b(tpa|insured|policy\s+holder)\b", 1),
+    ],
+}
+_COMPILED = {
+    doc_type: [(re.compile(pattern, re.IGNORECASE), weight)
+               for pattern, weight in rules]
+    for doc_type, rules in _RULES.items()
+}
+
+_stats = {"local": 0, "llm": 0}
+
+
+def classify_locally(text: str) -> Tuple[str, float]:
+    """
+    Score the document against keyword/regex rules for each type.
+    Returns the best label and a confidence in [0, 1] based on its score and
+    its margin over the runner-up; ("other", 0.0) when nothing matches.
+    """
+    head = text[:LOCAL_CLASSIFIER_CHARS]
+    scores = {
+        doc_type: sum(weight for regex, weight in rules if regex.search(head))
+        for doc_type, rules in _COMPILED.items()
+    }
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (label, best), (_, runner_up) = ranked[0], ranked[1]
+    if best == 0:
+        return "other", 0.0
+    confidence = (best - runner_up) / best * min(1.0, best / _FULL_SCORE)
+    return label, round(confidence, 3)
+
+
+def record_classification(source: str):
+    """Count whether a classification came from the local model or the LLM."""
+    _stats[source] += 1
+
+
+def classifier_stats() -> dict:
+    """How often the local classifier short-circuited the LLM."""
+    total = _stats["local"] + _stats["llm"]
+    return {
+        "threshold": LOCAL_CLASSIFIER_THRESHOLD,
+        "local": _stats["local"],
+        "llm": _stats["llm"],
+        "short_circuit_rate": round(_stats["local"] / total, 3) if total else 0.0
+    }
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+    from pdf_text_extractor import extract_text_from_pdf
+    for pdf_file in sorted(Path("documents").glob("*.pdf")):
+        try:
+            text = extract_text_from_pdf(pdf_file.read_bytes())
+        except Exception as e:
+            print(f"[Classifier] ERROR extracting {pdf_file.name}: {e}")
+            continue
+        label, confidence = classify_locally(text)
+        print(f"[Classifier] {pdf_file.name}: {label} ({confidence})")
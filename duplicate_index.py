@@ -0,0 +1,226 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Set DUPLICATE_INDEX_ENABLED=0 to skip near-duplicate checks across claims
+DUPLICATE_INDEX_ENABLED = os.getenv("DUPLICATE_INDEX_ENABLED", "1") == "1"
+# SQLite file holding the MinHash signatures of every processed document
+DUPLICATE_DB_PATH = os.getenv("DUPLICATE_DB_PATH", "duplicates/signatures.sqlite3")
+# Estimated Jaccard similarity of word shingles above which documents are near-duplicates
+DUPLICATE_MIN_SIMILARITY = float(os.getenv("DUPLICATE_MIN_SIMILARITY", "0.8"))
+# Documents with fewer word shingles than this are too short to compare
+DUPLICATE_MIN_SHINGLES = int(os.getenv("DUPLICATE_MIN_SHINGLES", "8"))
+SHINGLE_WORDS = 3
+# 64 MinHash values split into 16 LSH bands of 4: documents sharing any whole
+# band become candidates (about 99.9% likely at similarity 0.8, 12% at 0.3),
+# so a lookup is 16 indexed equality probes instead of a scan
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+# Candidates verified per lookup, newest first, so a crowded bucket cannot stall it
+_MAX_CANDIDATES = 2000
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SEEDS = np.arange(1, NUM_PERMUTATIONS + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+_lock = threading.Lock()
+_db: Optional[sqlite3.Connection] = None
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, used as a fast seeded 64-bit hash over arrays."""
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """Distinct 64-bit hashes of the text's overlapping word 3-shingles."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    count = len(tokens) - SHINGLE_WORDS + 1
+    if count < 1:
+        return np.zeros(0, dtype=np.uint64)
+    # Hash each distinct word once (crc32 is stable across processes), then
+    # chain neighbouring word hashes into shingle hashes as array operations
+    vocabulary = {}
+    ids = np.fromiter((vocabulary.setdefault(t, len(vocabulary)) for t in tokens),
+                      dtype=np.int64, count=len(tokens))
+    words = _mix(np.fromiter((zlib.crc32(t.encode()) for t in vocabulary),
+                             dtype=np.uint64, count=len(vocabulary)))[ids]
+    shingles = words[:count]
+    for offset in range(1, SHINGLE_WORDS):
+        shingles = _mix(shingles ^ words[offset:offset + count])
+    return np.unique(shingles)
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """
+    MinHash signature (NUM_PERMUTATIONS uint32 values) of the text's word
+    shingles; the share of equal values estimates the Jaccard similarity of
+    two texts. Returns None for texts too short to compare.
+    """
+    shingles = _shingle_hashes(text)
+    if len(shingles) < DUPLICATE_MIN_SHINGLES:
+        return None
+    hashed = _mix(shingles[None, :] ^ _SEEDS[:, None])
+    return (hashed.min(axis=1) >> np.uint64(32)).astype(np.uint32)
+
+
+def _band_keys(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit key per LSH band (the band number is mixed in)."""
+    rows = signature.reshape(LSH_BANDS, -1).astype(np.uint64)
+    keys = np.arange(LSH_BANDS, dtype=np.uint64)
+    for column in rows.T:
+        keys = _mix(keys ^ column)
+    return keys.view(np.int64).tolist()
+
+
+def _get_db() -> sqlite3.Connection:
+    global _db
+    if _db is None:
+        os.makedirs(os.path.dirname(DUPLICATE_DB_PATH) or ".", exist_ok=True)
+        _db = sqlite3.connect(DUPLICATE_DB_PATH, check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute("PRAGMA synchronous=NORMAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id INTEGER PRIMARY KEY, claim_id TEXT NOT NULL, filename TEXT, "
+            "doc_type TEXT, sha256 TEXT NOT NULL, signature BLOB NOT NULL, "
+            "created_at REAL NOT NULL)")
+        _db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS documents_claim_sha ON documents(claim_id, sha256)")
+        # Clustered on the band key, so each probe reads one contiguous range
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS bands ("
+            "key INTEGER NOT NULL, document INTEGER NOT NULL, "
+            "PRIMARY KEY (key, document)) WITHOUT ROWID")
+        _db.commit()
+    return _db
+
+
+def find_near_duplicates(signature: np.ndarray, exclude_claim: Optional[str] = None,
+                         limit: int = 5) -> List[dict]:
+    """
+    Stored documents whose estimated similarity to the signature is at least
+    DUPLICATE_MIN_SIMILARITY, most similar first, skipping documents of exclude_claim.
+    """
+    keys = _band_keys(signature)
+    with _lock:
+        rows = _get_db().execute(
+            "SELECT id, claim_id, filename, doc_type, sha256, signature FROM documents "
+            "WHERE id IN (SELECT DISTINCT document FROM bands WHERE key IN "
+            f"({', '.join('?' * len(keys))}) ORDER BY document DESC LIMIT {_MAX_CANDIDATES}) "
+            "AND claim_id IS NOT ?",
+            (*keys, exclude_claim)).fetchall()
+    if not rows:
+        return []
+    stored = np.frombuffer(b"".join(row[5] for row in rows), dtype=np.uint32)
+    similarity = (stored.reshape(len(rows), -1) == signature).mean(axis=1)
+    matches = [{"claim_id": row[1], "filename": row[2], "type": row[3], "sha256": row[4],
+                "similarity": round(float(score), 3)}
+               for row, score in zip(rows, similarity) if score >= DUPLICATE_MIN_SIMILARITY]
+    return sorted(matches, key=lambda m: -m["similarity"])[:limit]
+
+
+# (filename, doc_type, sha256, signature) of a document waiting to be indexed
+PendingDocument = Tuple[Optional[str], Optional[str], str, np.ndarray]
+
+
+def add_documents(claim_id: str, documents: Sequence[PendingDocument]):
+    """
+    Store the signatures and LSH bands of a claim's documents in one
+    transaction (once per claim and PDF content).
+    """
+    if not documents:
+        return
+    with _lock:
+        db = _get_db()
+        for filename, doc_type, sha256, signature in documents:
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO documents (claim_id, filename, doc_type, sha256, signature, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (claim_id, filename, doc_type, sha256, signature.astype(np.uint32).tobytes(), time.time()))
+            if cursor.rowcount:
+                db.executemany("INSERT OR IGNORE INTO bands (key, document) VALUES (?, ?)",
+                               [(key, cursor.lastrowid) for key in _band_keys(signature)])
+        db.commit()
+
+
+def add_document(claim_id: str, filename: Optional[str], doc_type: Optional[str],
+                 sha256: str, signature: np.ndarray):
+    """Store a single document's signature and LSH bands."""
+    add_documents(claim_id, [(filename, doc_type, sha256, signature)])
+
+
+def check_document(claim_id: str, text: str) -> Tuple[List[dict], Optional[np.ndarray]]:
+    """
+    Look a newly processed document up among the documents of other claims,
+    without adding it: callers index a claim's documents with add_documents
+    once the whole claim has completed, so a failed claim leaves nothing behind.
+    Returns its near-duplicates and its signature (empty and None when the
+    index is disabled or the text is too short to compare).
+    """
+    if not DUPLICATE_INDEX_ENABLED:
+        return [], None
+    signature = minhash(text)
+    if signature is None:
+        return [], None
+    return find_near_duplicates(signature, exclude_claim=claim_id), signature
+
+
+def open_duplicate_index():
+    """Open the signature database ahead of the first request."""
+    if DUPLICATE_INDEX_ENABLED:
+        with _lock:
+            _get_db()
+
+
+def close_duplicate_index():
+    """Close the signature database (called from the FastAPI lifespan)."""
+    global _db
+    with _lock:
+        if _db is not None:
+            _db.close()
+            _db = None
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    DUPLICATE_DB_PATH = os.path.join(tempfile.mkdtemp(), "signatures.sqlite3")
+    bill = ("City Hospital final bill. Patient John Doe, admitted 2024-04-01, discharged "
+            "2024-04-10. Room charges 12000, pharmacy 8450, laboratory 3200, consultation "
+            "2500, total amount payable 26150. Thank you for choosing City Hospital.")
+    edited = bill.replace("pharmacy 8450", "pharmacy 8540")
+    other = ("Discharge summary for Jane Roe. Diagnosis: acute appendicitis, laparoscopic "
+             "appendectomy performed, recovery uneventful, review after two weeks.")
+    print(f"[Duplicates] edited bill similarity {(minhash(bill) == minhash(edited)).mean():.2f}, "
+          f"unrelated summary {(minhash(bill) == minhash(other)).mean():.2f}")
+
+    # Fill the index with random signatures, then time lookups against it
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = np.random.default_rng(0)
+    started = time.perf_counter()
+    db = _get_db()
+    for first in range(0, count, 10_000):
+        signatures = rng.integers(0, 2 ** 32, size=(min(10_000, count - first), NUM_PERMUTATIONS),
+                                  dtype=np.uint32)
+        db.executemany(
+            "INSERT INTO documents (id, claim_id, sha256, signature, created_at) VALUES (?, ?, ?, ?, 0)",
+            ((first + i + 1, f"claim-{first + i}", "-", s.tobytes()) for i, s in enumerate(signatures)))
+        db.executemany(
+            "INSERT OR IGNORE INTO bands (key, document) VALUES (?, ?)",
+            ((key, first + i + 1) for i, s in enumerate(signatures) for key in _band_keys(s)))
+    db.commit()
+    print(f"[Duplicates] indexed {count} signatures in {time.perf_counter() - started:.1f}s")
+    add_document("claim-a", "bill.pdf", "bill", "a", minhash(bill))
+    started = time.perf_counter()
+    for _ in range(1000):
+        matches, _ = check_document("claim-b", edited)
+    print(f"[Duplicates] {time.perf_counter() - started:.3f} ms per lookup, matches: {matches}")
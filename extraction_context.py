@@ -0,0 +1,132 @@
+import os
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from faiss_store import get_index
+from metrics import stage
+
+# Approximate token budget for the document text sent with an extraction prompt
+EXTRACTION_TOKEN_BUDGET = int(os.getenv("EXTRACTION_TOKEN_BUDGET", "500"))
+# Rough characters-per-token ratio used for budgeting
+CHARS_PER_TOKEN = 4
+# Weight of a lexical anchor match relative to the retrieval score
+_ANCHOR_WEIGHT = 0.5
+# Weight of the head/tail position prior
+_POSITION_WEIGHT = 0.25
+
+# field -> (retrieval query, lexical anchor, where the field usually sits: head/tail/None)
+FIELD_HINTS = {
+    "bill": {
+        "hospital_name": ("hospital name address gstin", r"hospital|medical\s+cent(re|er)|healthcare|clinic", "head"),
+        "patient_name": ("patient name age sex", r"patient('s)?\s+name|\bname\s*:", "head"),
+        "total_amount": ("total amount net payable grand total amount due",
+                         r"total\s+(bill\s+)?amount|net\s+(amount|payable)|grand\s+total|amount\s+payable", "tail"),
+        "date_of_service": ("bill date date of service invoice date",
+                            r"bill\s+date|date\s+of\s+service|invoice\s+date|\bdate\s*:", "head"),
+    },
+    "discharge_summary": {
+        "patient_name": ("patient name age sex", r"patient('s)?\s+name|\bname\s*:", "head"),
+        "diagnosis": ("final diagnosis provisional diagnosis", r"diagnosis", None),
+        "admission_date": ("date of admission admitted on", r"date\s+of\s+admission|admission\s+date|\bdoa\b|admitted\s+on", "head"),
+        "discharge_date": ("date of discharge discharged on", r"date\s+of\s+discharge|discharge\s+date|\bdod\b|discharged\s+on", "head"),
+    },
+    "id_card": {
+        "patient_name": ("name of insured member name", r"\bname\b", "head"),
+        "patient_id": ("member id uhid card number", r"member\s*id|uhid|card\s*(no|number)", "head"),
+        "insurance_provider": ("insurance company tpa provider", r"insurance|assurance|tpa", "head"),
+        "policy_number": ("policy number policy no", r"policy\s*(no|number|#)", None),
+        "validity_date": ("valid till validity expiry", r"valid|validity|expir", None),
+    },
+}
+
+_COMPILED = {
+    doc_type: {field: (query, re.compile(anchor, re.IGNORECASE), position)
+               for field, (query, anchor, position) in fields.items()}
+    for doc_type, fields in FIELD_HINTS.items()
+}
+
+_stats = {"documents": 0, "tokens": 0, "full_text_tokens": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting prompts."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _field_rankings(doc_id: str, chunks: List[str], doc_type: Optional[str]) -> List[np.ndarray]:
+    """Chunk positions ranked best-first for each requested field."""
+    index = get_index()
+    n = len(chunks)
+    positions = np.arange(n, dtype=np.float32) / max(n - 1, 1)
+    if doc_type is None:
+        fields = [hint for hints in _COMPILED.values()
+                  for hint in hints.values()]
+    else:
+        fields = list(_COMPILED.get(doc_type, {}).values())
+    rankings = []
+    for query, anchor, position in fields:
+        scores = index.document_scores(doc_id, query)
+        scores = scores + _ANCHOR_WEIGHT * np.fromiter(
+            (1.0 if anchor.search(chunk) else 0.0 for chunk in chunks), dtype=np.float32, count=n)
+        if position == "head":
+            scores = scores + _POSITION_WEIGHT * (1.0 - positions)
+        elif position == "tail":
+            scores = scores + _POSITION_WEIGHT * positions
+        rankings.append(np.argsort(-scores, kind="stable"))
+    return rankings
+
+
+def build_extraction_context(text: str, doc_type: Optional[str] = None,
+                             token_budget: int = EXTRACTION_TOKEN_BUDGET) -> Tuple[str, int]:
+    """
+    Pick the chunks most relevant to the fields of doc_type (all known fields
+    when None) and pack them, in document order, into token_budget.
+    Chunks are taken round-robin from each field's ranking, which combines
+    retrieval similarity, lexical anchors and a head/tail position prior.
+    Returns the context and its estimated token count.
+    """
+    full_tokens = estimate_tokens(text)
+    if full_tokens <= token_budget:
+        context = text
+    else:
+        with stage("index"):
+            doc_id = get_index().add_document(text)
+            chunks = get_index().document_chunks(doc_id)
+        rankings = _field_rankings(doc_id, chunks, doc_type)
+        # Types without field hints fall back to the document prefix
+        if not rankings:
+            rankings = [np.arange(len(chunks))]
+        selected = set()
+        used = 0
+        for rank in range(len(chunks)):
+            for ranking in rankings:
+                position = int(ranking[rank])
+                if position in selected:
+                    continue
+                cost = estimate_tokens(chunks[position])
+                if used + cost <= token_budget:
+                    selected.add(position)
+                    used += cost
+            if used >= token_budget:
+                break
+        context = "\n...\n".join(chunks[i] for i in sorted(selected))
+        if not context:
+            context = text[:token_budget * CHARS_PER_TOKEN]
+    tokens = estimate_tokens(context)
+    _stats["documents"] += 1
+    _stats["tokens"] += tokens
+    _stats["full_text_tokens"] += full_tokens
+    return context, tokens
+
+
+def context_stats() -> dict:
+    """Average extraction-context tokens sent per document versus the full text."""
+    documents = _stats["documents"]
+    return {
+        "token_budget": EXTRACTION_TOKEN_BUDGET,
+        "documents": documents,
+        "avg_tokens_per_document": round(_stats["tokens"] / documents, 1) if documents else 0.0,
+        "avg_full_text_tokens": round(_stats["full_text_tokens"] / documents, 1) if documents else 0.0
+    }
@@ -1,28 +1,279 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import FakeEmbeddings
+import os
+import re
+import json
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 
+import numpy as np
 
-def store_text_in_faiss(text: str, embedding_size: int = 1536):
+# Dimensionality of the hashed bag-of-words embeddings
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "1024"))
+# Directory holding the persisted index (vectors.f16 + chunks.jsonl)
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "vector_store")
+# Documents kept in the index; the least recently used are evicted beyond this
+VECTOR_STORE_MAX_DOCUMENTS = int(os.getenv("VECTOR_STORE_MAX_DOCUMENTS", "5000"))
+CHUNK_SIZE = 512
+CHUNK_OVERLAP = 64
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def split_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Split text into chunks of at most chunk_size characters, preferring
+    paragraph, line and word boundaries, with up to chunk_overlap characters
+    of overlap. Overlaps start at a word boundary (none if the overlap has no whitespace).
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            window = text[start:end]
+            for sep in ("\n\n", "\n", " "):
+                cut = window.rfind(sep)
+                if cut > chunk_size // 2:
+                    end = start + cut + len(sep)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+        # Start the next chunk at the first word beginning inside the overlap
+        gap = _SPACE_RE.search(text, max(end - chunk_overlap - 1, start), end)
+        start = max(gap.end() if gap else end, start + 1)
+    return chunks
+
+
+def embed_texts(texts: List[str], dim: int = VECTOR_DIM) -> np.ndarray:
+    """
+    CPU-only hashing embedder: unigrams and bigrams are hashed into `dim`
+    signed buckets, log-scaled and L2-normalized. Returns float16 rows.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = _TOKEN_RE.findall(text.lower())
+        grams = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+        if not grams:
+            continue
+        # crc32 is stable across processes, unlike hash()
+        digests = np.fromiter((zlib.crc32(g.encode()) for g in grams),
+                              dtype=np.uint32, count=len(grams))
+        buckets = (digests % dim).astype(np.int64)
+        signs = np.where(digests >> 31, -1.0, 1.0)
+        np.add.at(vectors[row], buckets, signs)
+    vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float16)
+
+
+class ChunkIndex:
+    """
+    Long-lived chunk index persisted under a directory.
+    Vectors are stored as a raw float16 matrix that is memory-mapped on load;
+    chunk texts live in a JSON-lines sidecar and are read from disk on demand,
+    so memory only holds each document's row range and sidecar offset.
+    Documents are added incrementally and keyed by the SHA-256 of their text.
+    Past max_documents the least recently used documents are evicted and both
+    files rewritten without them. Each directory must have a single writer process.
+    """
+
+    def __init__(self, directory: str = VECTOR_STORE_DIR, dim: int = VECTOR_DIM,
+                 max_documents: int = VECTOR_STORE_MAX_DOCUMENTS):
+        self.directory = directory
+        self.dim = dim
+        self.max_documents = max(1, max_documents)
+        self._vectors_path = os.path.join(directory, "vectors.f16")
+        self._chunks_path = os.path.join(directory, "chunks.jsonl")
+        self._lock = threading.Lock()
+        self._rows = 0
+        # doc_id -> (first row, end row, sidecar offset, sidecar line length),
+        # least recently used first
+        self._documents: "OrderedDict[str, Tuple[int, int, int, int]]" = OrderedDict()
+        self._vectors = np.zeros((0, dim), dtype=np.float16)
+        self._load()
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self._chunks_path):
+            return
+        offset = 0
+        with open(self._chunks_path, "rb") as f:
+            for line in f:
+                record = json.loads(line)
+                start = self._rows
+                self._rows += len(record["chunks"])
+                self._documents[record["doc_id"]] = (start, self._rows, offset, len(line))
+                offset += len(line)
+        # Drop vectors written by an add that crashed before its sidecar line
+        expected = self._rows * self.dim * np.dtype(np.float16).itemsize
+        if not os.path.exists(self._vectors_path):
+            # A sidecar without its vectors cannot be searched; start over
+            os.remove(self._chunks_path)
+            self._documents.clear()
+            self._rows = 0
+            return
+        if os.path.getsize(self._vectors_path) > expected:
+            os.truncate(self._vectors_path, expected)
+        self._map_vectors()
+        if len(self._documents) > self.max_documents:
+            self._evict()
+
+    def _map_vectors(self):
+        if self._rows:
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=np.float16, mode="r", shape=(self._rows, self.dim))
+        else:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float16)
+
+    def _evict(self):
+        """
+        Drop least recently used documents down to 90% of max_documents (so
+        rewrites are amortized over many adds) and rewrite both files.
+        """
+        keep = list(self._documents.items())[-int(self.max_documents * 0.9) or -1:]
+        vectors_tmp = self._vectors_path + ".tmp"
+        chunks_tmp = self._chunks_path + ".tmp"
+        documents = OrderedDict()
+        rows = offset = 0
+        with open(vectors_tmp, "wb") as vectors_out, open(chunks_tmp, "wb") as chunks_out, \
+                open(self._chunks_path, "rb") as chunks_in:
+            for doc_id, (start, end, line_offset, length) in keep:
+                vectors_out.write(np.asarray(self._vectors[start:end]).tobytes())
+                chunks_in.seek(line_offset)
+                chunks_out.write(chunks_in.read(length))
+                documents[doc_id] = (rows, rows + end - start, offset, length)
+                rows += end - start
+                offset += length
+        # Vectors first: a sidecar without its vectors would be misaligned on load
+        os.replace(vectors_tmp, self._vectors_path)
+        os.replace(chunks_tmp, self._chunks_path)
+        self._documents = documents
+        self._rows = rows
+        self._map_vectors()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _touch(self, doc_id: str) -> Tuple[int, int, int, int]:
+        self._documents.move_to_end(doc_id)
+        return self._documents[doc_id]
+
+    def add_document(self, text: str) -> str:
+        """Embed and persist a document's chunks unless already indexed. Returns its doc_id."""
+        doc_id = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if doc_id in self._documents:
+                self._touch(doc_id)
+                return doc_id
+        chunks = split_text(text)
+        vectors = embed_texts(chunks, self.dim)
+        line = (json.dumps({"doc_id": doc_id, "chunks": chunks}) + "\n").encode("utf-8")
+        with self._lock:
+            if doc_id in self._documents:
+                self._touch(doc_id)
+                return doc_id
+            # Vectors first, then the sidecar line that makes them visible
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._chunks_path, "ab") as f:
+                offset = f.tell()
+                f.write(line)
+            start = self._rows
+            self._rows += len(chunks)
+            self._documents[doc_id] = (start, self._rows, offset, len(line))
+            self._map_vectors()
+            if len(self._documents) > self.max_documents:
+                self._evict()
+        return doc_id
+
+    def _read_chunks(self, offset: int, length: int) -> List[str]:
+        with open(self._chunks_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))["chunks"]
+
+    def document_chunks(self, doc_id: str) -> List[str]:
+        """All chunks of an indexed document, in document order."""
+        with self._lock:
+            _, _, offset, length = self._touch(doc_id)
+            return self._read_chunks(offset, length)
+
+    def _score(self, vectors: np.ndarray, query: str) -> np.ndarray:
+        return np.asarray(vectors, dtype=np.float32) @ embed_texts(
+            [query], self.dim)[0].astype(np.float32)
+
+    def document_scores(self, doc_id: str, query: str) -> np.ndarray:
+        """Cosine similarity of the query to every chunk of a document, in document order."""
+        with self._lock:
+            start, end, _, _ = self._touch(doc_id)
+            vectors = self._vectors[start:end]
+        return self._score(vectors, query)
+
+    def _chunk_at(self, row: int) -> str:
+        for start, end, offset, length in self._documents.values():
+            if start <= row < end:
+                return self._read_chunks(offset, length)[row - start]
+        raise KeyError(row)
+
+    def search(self, query: str, k: int = 3, doc_id: Optional[str] = None) -> List[Tuple[float, int, str]]:
+        """
+        Return up to k (score, chunk_position, chunk) tuples by cosine similarity,
+        restricted to one document when doc_id is given. chunk_position is the
+        chunk's index within its document when doc_id is given, else a global row.
+        """
+        with self._lock:
+            if doc_id is not None:
+                start, end, offset, length = self._touch(doc_id)
+                chunks = self._read_chunks(offset, length)
+            else:
+                start, end, chunks = 0, self._rows, None
+            vectors = self._vectors[start:end]
+        if end == start:
+            return []
+        scores = self._score(vectors, query)
+        k = min(k, end - start)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        with self._lock:
+            texts = [chunks[i] if chunks is not None else self._chunk_at(int(i)) for i in top]
+        return [(float(scores[i]), int(i), text) for i, text in zip(top, texts)]
+
+
+_index: Optional[ChunkIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> ChunkIndex:
+    """The process-wide index, loaded from VECTOR_STORE_DIR on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ChunkIndex()
+        return _index
+
+
+def store_text_in_faiss(text: str) -> str:
     """
-    Split the text and store it in a FAISS vectorstore using fake embeddings (for demo/testing).
-    Returns the FAISS vectorstore object.
+    Add the text to the shared persistent index (a no-op if it is already there).
+    Returns the document id to pass to retrieve_relevant_chunk.
     """
-    docs = [text]
-    splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=64)
-    doc_chunks = splitter.create_documents(docs)
-    vectorstore = FAISS.from_documents(
-        doc_chunks, FakeEmbeddings(size=embedding_size))
-    return vectorstore
+    return get_index().add_document(text)
 
 
-def retrieve_relevant_chunk(vectorstore, query: str, k: int = 3) -> str:
+def retrieve_relevant_chunk(doc_id: str, query: str, k: int = 3) -> str:
     """
-    Retrieve the most relevant chunk(s) from the FAISS vectorstore for a given query.
-    Returns the page_content of the top chunk.
+    Retrieve the most relevant chunk of a stored document for a given query.
+    Returns the text of the top chunk.
     """
-    relevant_docs = vectorstore.similarity_search(query, k=k)
-    return relevant_docs[0].page_content if relevant_docs else ""
+    results = get_index().search(query, k=k, doc_id=doc_id)
+    return results[0][2] if results else ""
 
 
 if __name__ == "__main__":
@@ -32,23 +283,13 @@ if __name__ == "__main__":
     pdfs = list(doc_dir.glob("*.pdf"))
     if pdfs:
         from pdf_text_extractor import extract_text_from_pdf
-        with open(pdfs[0], "rb") as f:
-            class DummyFile:
-                def __init__(self, content):
-                    self._content = content
-
-                def read(self):
-                    return self._content
-
-                def seek(self, pos):
-                    pass
-            dummy_file = DummyFile(f.read())
-            text = extract_text_from_pdf(dummy_file)
+        text = extract_text_from_pdf(pdfs[0].read_bytes())
     else:
         text = "This is a test medical bill for John Doe at Test Hospital. Total amount: $1234.56."
-    print("[FAISS TEST] Storing text in FAISS...")
-    store = store_text_in_faiss(text)
+    print("[VECTOR TEST] Storing text in the index...")
+    doc_id = store_text_in_faiss(text)
+    print(f"[VECTOR TEST] {len(get_index())} documents indexed, doc_id={doc_id[:12]}")
     query = "hospital"
-    print(f"[FAISS TEST] Querying for: '{query}'")
-    result = retrieve_relevant_chunk(store, query)
-    print(f"[FAISS TEST] Top result:\n{result[:300]}\n...")
+    print(f"[VECTOR TEST] Querying for: '{query}'")
+    result = retrieve_relevant_chunk(doc_id, query)
+    print(f"[VECTOR TEST] Top result:\n{result[:300]}\n...")
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import asyncio
+import threading
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple
+
+# SQLite file backing the persistent batch queue
+BATCH_DB_PATH = os.getenv("BATCH_DB_PATH", "batch/jobs.sqlite3")
+# Where PDFs uploaded to /claims/batch are kept until their job finishes
+BATCH_SPOOL_DIR = os.getenv("BATCH_SPOOL_DIR", "batch/uploads")
+# Background workers draining the queue
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+# Attempts per job before it is marked failed
+BATCH_MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", "3"))
+# Seconds an idle worker waits before polling the queue again
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "1.0"))
+# Seconds a running job stays leased to its process without a heartbeat; jobs
+# of a process that died are picked up again once their lease runs out
+BATCH_LEASE_SECONDS = float(os.getenv("BATCH_LEASE_SECONDS", "60"))
+# Seconds a job waits before retrying after the handler reported backpressure
+BATCH_BACKPRESSURE_DELAY = float(os.getenv("BATCH_BACKPRESSURE_DELAY", "5"))
+# Longest pause of a worker after repeated queue database errors, in seconds
+_MAX_DB_BACKOFF = 30.0
+
+# Identifies this process as the owner of the jobs it runs
+_OWNER = uuid.uuid4().hex
+_lock = threading.Lock()
+_db: Optional[sqlite3.Connection] = None
+_workers: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+
+
+def _get_db() -> sqlite3.Connection:
+    global _db
+    if _db is None:
+        os.makedirs(os.path.dirname(BATCH_DB_PATH) or ".", exist_ok=True)
+        _db = sqlite3.connect(BATCH_DB_PATH, check_same_thread=False)
+        _db.row_factory = sqlite3.Row
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, files TEXT NOT NULL, "
+            "spool_dir TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL, available_at REAL NOT NULL)")
+        columns = {row["name"] for row in _db.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            _db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            _db.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+        _db.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs(status, available_at)")
+        _db.commit()
+    return _db
+
+
+def enqueue(files: List[str], spool_dir: Optional[str] = None) -> str:
+    """Queue a claim made of the given PDF paths. Returns its job id."""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _lock:
+        db = _get_db()
+        db.execute(
+            "INSERT INTO jobs (job_id, status, files, spool_dir, created_at, updated_at, available_at) "
+            "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, json.dumps(files), spool_dir, now, now, now))
+        db.commit()
+    if _wakeup is not None:
+        _wakeup.set()
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Status, attempts, error and result of a job, or None if unknown."""
+    with _lock:
+        row = _get_db().execute(
+            "SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "job_id": row["job_id"],
+        "status": row["status"],
+        "files": [os.path.basename(f) for f in json.loads(row["files"])],
+        "attempts": row["attempts"],
+        "error": row["error"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"]
+    }
+
+
+def completed_results(batch_size: int = 1000) -> Iterator[List[Tuple[str, dict]]]:
+    """(job_id, result) of every completed job, in batches ordered by job id."""
+    last = ""
+    while True:
+        with _lock:
+            rows = _get_db().execute(
+                "SELECT job_id, result FROM jobs WHERE status = 'completed' AND job_id > ? "
+                "ORDER BY job_id LIMIT ?", (last, batch_size)).fetchall()
+        if not rows:
+            return
+        yield [(row["job_id"], json.loads(row["result"])) for row in rows]
+        last = rows[-1]["job_id"]
+
+
+def update_results(results: List[Tuple[str, dict]]):
+    """Overwrite the stored results of completed jobs (e.g. after re-validation)."""
+    now = time.time()
+    with _lock:
+        db = _get_db()
+        db.executemany(
+            "UPDATE jobs SET result = ?, updated_at = ? WHERE job_id = ?",
+            [(json.dumps(result), now, job_id) for job_id, result in results])
+        db.commit()
+
+
+_CLAIMABLE = ("(status = 'queued' AND available_at <= ?) "
+              "OR (status = 'running' AND lease_until < ?)")
+
+
+def _claim_next() -> Optional[sqlite3.Row]:
+    """
+    Lease the oldest ready job (or one whose owner stopped renewing its lease)
+    to this process. The conditional UPDATE makes the claim atomic across
+    processes sharing the database; a job another process took first is skipped.
+    """
+    while True:
+        now = time.time()
+        with _lock:
+            db = _get_db()
+            row = db.execute(
+                f"SELECT * FROM jobs WHERE {_CLAIMABLE} ORDER BY created_at LIMIT 1",
+                (now, now)).fetchone()
+            if row is None:
+                return None
+            claimed = db.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, "
+                f"attempts = attempts + 1, updated_at = ? WHERE job_id = ? AND ({_CLAIMABLE})",
+                (_OWNER, now + BATCH_LEASE_SECONDS, now, row["job_id"], now, now)).rowcount
+            db.commit()
+        if claimed:
+            return row
+
+
+def _renew_lease(job_id: str) -> bool:
+    """Extend this process's lease on a running job. False if the lease was lost."""
+    now = time.time()
+    with _lock:
+        db = _get_db()
+        renewed = db.execute(
+            "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND owner = ? AND status = 'running'",
+            (now + BATCH_LEASE_SECONDS, job_id, _OWNER)).rowcount
+        db.commit()
+    return bool(renewed)
+
+
+async def _heartbeat(job_id: str):
+    while True:
+        await asyncio.sleep(BATCH_LEASE_SECONDS / 3)
+        if not _renew_lease(job_id):
+            return
+
+
+def _finish(job_id: str, status: str, result: Optional[dict] = None,
+            error: Optional[str] = None, retry_at: Optional[float] = None,
+            refund_attempt: bool = False) -> bool:
+    """
+    Record the outcome of a job this process still holds the lease on.
+    False if the lease was lost and another worker may now own the job.
+    """
+    now = time.time()
+    with _lock:
+        db = _get_db()
+        finished = db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, available_at = ?, "
+            "attempts = attempts - ?, owner = NULL, lease_until = NULL "
+            "WHERE job_id = ? AND owner = ?",
+            (status, json.dumps(result) if result is not None else None,
+             error, now, retry_at or now, int(refund_attempt), job_id, _OWNER)).rowcount
+        db.commit()
+    return finished > 0
+
+
+async def _worker(handler: Callable[[List[str], str], Awaitable[dict]],
+                  backpressure: Tuple[type, ...]):
+    db_errors = 0
+    while True:
+        try:
+            row = _claim_next()
+        except sqlite3.Error as e:
+            # e.g. "database is locked" while another process writes; keep the worker alive
+            db_errors += 1
+            delay = min(BATCH_POLL_INTERVAL * 2 ** db_errors, _MAX_DB_BACKOFF)
+            print(f"[BatchQueue] ERROR claiming a job: {e}; retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            continue
+        db_errors = 0
+        if row is None:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=BATCH_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        job_id, attempts = row["job_id"], row["attempts"] + 1
+        heartbeat = asyncio.create_task(_heartbeat(job_id))
+        try:
+            result = await handler(json.loads(row["files"]), job_id)
+        except asyncio.CancelledError:
+            # Shutdown, not the job's fault: give the attempt back
+            _finish(job_id, "queued", refund_attempt=True)
+            raise
+        except backpressure as e:
+            # Not the job's fault: retry later without using up an attempt
+            _finish(job_id, "queued", error=str(e),
+                    retry_at=time.time() + BATCH_BACKPRESSURE_DELAY, refund_attempt=True)
+            continue
+        except Exception as e:
+            if attempts < BATCH_MAX_ATTEMPTS:
+                # Exponential backoff before the next attempt
+                _finish(job_id, "queued", error=str(e),
+                        retry_at=time.time() + 2 ** attempts)
+                continue
+            finished = _finish(job_id, "failed", error=str(e))
+        else:
+            finished = _finish(job_id, "completed", result=result)
+        finally:
+            heartbeat.cancel()
+        # Without the lease the job may be running elsewhere on these files
+        if finished and row["spool_dir"]:
+            shutil.rmtree(row["spool_dir"], ignore_errors=True)
+
+
+def start_workers(handler: Callable[[List[str], str], Awaitable[dict]],
+                  workers: int = BATCH_WORKERS, backpressure: Tuple[type, ...] = ()):
+    """
+    Start background tasks that drain the queue with handler(files, job_id),
+    which returns the claim result (called from the FastAPI lifespan).
+    Jobs whose handler raises one of the backpressure exceptions are retried
+    after BATCH_BACKPRESSURE_DELAY without counting an attempt; any other
+    exception is retried with exponential backoff up to BATCH_MAX_ATTEMPTS.
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+    _get_db()
+    for _ in range(workers):
+        _workers.append(asyncio.create_task(_worker(handler, backpressure)))
+
+
+async def stop_workers():
+    """Cancel the workers; jobs they were running are re-queued."""
+    global _db
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    with _lock:
+        if _db is not None:
+            _db.close()
+            _db = None
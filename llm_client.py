@@ -0,0 +1,96 @@
+import os
+import json
+import importlib.util
+from typing import List, Optional
+
+import httpx
+
+from metrics import stage, record_llm_usage, record_llm_error
+
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL")
+OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL")
+
+# Connection pool and timeout settings for the shared client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# HTTP/2 needs the optional h2 package (httpx[http2])
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1" and importlib.util.find_spec(
+    "h2") is not None
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def start_llm_client() -> httpx.AsyncClient:
+    """Create the app-lifetime LLM client (called from the FastAPI lifespan)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=LLM_HTTP2,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json"
+            })
+    return _client
+
+
+async def close_llm_client():
+    """Close the shared LLM client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def parse_json_content(content: str) -> dict:
+    """Parse a JSON object from a model reply, tolerating markdown code fences."""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`")
+        if content.lower().startswith("json"):
+            content = content[4:]
+    return json.loads(content)
+
+
+async def chat(messages: List[dict], max_tokens: int, temperature: float = 0,
+               timeout: Optional[float] = None) -> str:
+    """
+    Send a chat completion request through the shared client.
+    Returns the stripped message content; raises on HTTP or response-shape errors.
+    Latency and the token usage reported by the API are recorded in metrics.
+    """
+    client = start_llm_client()
+    data = {
+        "model": OPENROUTER_MODEL,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+    try:
+        with stage("llm"):
+            response = await client.post(
+                OPENROUTER_API_URL, json=data,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT)
+            response.raise_for_status()
+            result = response.json()
+            content = result["choices"][0]["message"]["content"].strip()
+    except Exception as e:
+        record_llm_error(e)
+        raise
+    record_llm_usage(result.get("usage"))
+    return content
+
+
+async def chat_json(messages: List[dict], max_tokens: int, temperature: float = 0,
+                    timeout: Optional[float] = None) -> dict:
+    """Like chat, but parses the reply as a JSON object."""
+    content = await chat(messages, max_tokens, temperature, timeout)
+    return parse_json_content(content)
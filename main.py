@@ -1,27 +1,462 @@
 # main.py
-from typing import List
+import os
+import json
+import uuid
+import shutil
+import time
+import asyncio
+from pathlib import Path
+from typing import List, Optional, Tuple
 from datetime import datetime
+from contextlib import aclosing, asynccontextmanager, suppress
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+# Imported first so the cold-start timing covers every other import
+from warmup import mark_imported, warm_up, readiness
 
-from models import ClaimDecision
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+
+from models import ClaimDecision, DOCUMENT_MODELS
 from agents import (
-    extract_text_from_pdf,
     classify_document_agent,
     extract_data_agent,
     validate_claim_agent,
-    decide_claim_agent
+    decide_claim_agent,
+    classify_and_extract_agent,
+    PROMPT_VERSION,
+    FUSED_EXTRACTION
+)
+from doc_classifier import classifier_stats
+from claim_validation import claim_verdict, revalidate_completed_jobs
+from duplicate_index import check_document, add_documents, close_duplicate_index, PendingDocument
+from extraction_context import context_stats
+from metrics import (
+    stage,
+    observe_stage,
+    start_trace,
+    render_metrics,
+    CLAIM_SECONDS,
+    DOCUMENTS,
+    DOCUMENT_ERRORS,
+    OCR_PENDING
+)
+from cache import cache_key, cache_get_async, cache_set_async, cache_stats, close_cache
+from llm_client import start_llm_client, close_llm_client, OPENROUTER_API_KEY, OPENROUTER_MODEL
+from pdf_text_extractor import OCR_DPI
+from upload_spool import (
+    spool_upload,
+    spooled_from_path,
+    discard,
+    SpooledUpload,
+    UploadTooLarge,
+    RequestSizeLimit,
+    UPLOAD_MAX_REQUEST_BYTES
+)
+from job_queue import enqueue, get_job, start_workers, stop_workers, BATCH_SPOOL_DIR
+from ocr_executor import (
+    start_extraction_pool,
+    shutdown_extraction_pool,
+    extract_text_async,
+    iter_pages_async,
+    pending_jobs,
+    ExtractionQueueFull,
+    ExtractionTimeout,
+    OCR_MAX_PENDING
 )
 
+mark_imported()
+
+# Documents of a single claim processed at the same time
+CLAIM_DOC_CONCURRENCY = int(os.getenv("CLAIM_DOC_CONCURRENCY", "4"))
+# Documents processed at the same time across all claims on this worker
+GLOBAL_DOC_CONCURRENCY = int(os.getenv("GLOBAL_DOC_CONCURRENCY", "16"))
+# Directory that manifest paths given to /claims/batch are resolved against
+BATCH_ROOT = os.getenv("BATCH_ROOT", "documents")
+# Pages the classifier starts from while the rest are still extracted (0 waits for all)
+CLASSIFY_FIRST_PAGES = int(os.getenv("CLASSIFY_FIRST_PAGES", "2"))
+# Document types read from their first pages only; extraction stops once classified
+SINGLE_PAGE_TYPES = {t.strip() for t in os.getenv(
+    "SINGLE_PAGE_TYPES", "id_card").split(",") if t.strip()}
+
+_global_doc_slots = asyncio.Semaphore(GLOBAL_DOC_CONCURRENCY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_extraction_pool()
+    start_llm_client()
+    start_workers(_run_batch_job, backpressure=(ExtractionQueueFull,))
+    # Warm up in the background so /health answers at once; /ready waits for it
+    warmup_task = asyncio.create_task(warm_up())
+    yield
+    warmup_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await warmup_task
+    await stop_workers()
+    await close_llm_client()
+    shutdown_extraction_pool()
+    close_cache()
+    close_duplicate_index()
+
+
 # Initialize FastAPI app
-app = FastAPI(title="Multi-Agent Claim Processor", version="1.0.0")
+app = FastAPI(title="Multi-Agent Claim Processor",
+              version="1.0.0", lifespan=lifespan)
+app.add_middleware(RequestSizeLimit, max_bytes=UPLOAD_MAX_REQUEST_BYTES)
+
+
+def _to_doc_dict(doc_type: str, extracted) -> dict:
+    """Convert extracted object to dict and filter only required fields"""
+    if doc_type == "bill":
+        return {
+            "type": "bill",
+            "hospital_name": getattr(extracted, "hospital_name", None),
+            "patient_name": getattr(extracted, "patient_name", None),
+            "total_amount": getattr(extracted, "total_amount", None),
+            "date_of_service": str(getattr(extracted, "bill_date", None))[:10] if getattr(extracted, "bill_date", None) else None
+        }
+    elif doc_type == "discharge_summary":
+        return {
+            "type": "discharge_summary",
+            "patient_name": getattr(extracted, "patient_name", None),
+            "diagnosis": getattr(extracted, "diagnosis", None),
+            "admission_date": str(getattr(extracted, "admission_date", None))[:10] if getattr(extracted, "admission_date", None) else None,
+            "discharge_date": str(getattr(extracted, "discharge_date", None))[:10] if getattr(extracted, "discharge_date", None) else None
+        }
+    elif doc_type == "id_card":
+        return {
+            "type": "id_card",
+            "patient_name": getattr(extracted, "patient_name", None),
+            "patient_id": getattr(extracted, "patient_id", None),
+            "insurance_provider": getattr(extracted, "insurance_provider", None),
+            "policy_number": getattr(extracted, "policy_number", None),
+            "validity_date": str(getattr(extracted, "validity_date", None))[:10] if getattr(extracted, "validity_date", None) else None
+        }
+    return {"type": "other", "content_summary": getattr(
+        extracted, "content_summary", None)}
+
+
+def _ocr_settings() -> str:
+    # Imported on first use: ocr_preprocess pulls in PIL, which warm-up preloads
+    from ocr_preprocess import OCR_SETTINGS_FINGERPRINT
+    return OCR_SETTINGS_FINGERPRINT
+
+
+def _text_key(digest: str) -> str:
+    return cache_key("text", digest, OCR_DPI, _ocr_settings())
+
+
+async def _extract_text(path: str, digest: str, bypass_cache: bool) -> str:
+    key = _text_key(digest)
+    text = None if bypass_cache else await cache_get_async("text", key)
+    if text is None:
+        with stage("extract_text"):
+            text = await extract_text_async(path)
+        await cache_set_async("text", key, text)
+    return text
+
+
+# Labels and fields come from the OCR text, so they are keyed on its settings too
+def _classify_key(digest: str) -> str:
+    return cache_key("classify", digest, OCR_DPI, _ocr_settings(), OPENROUTER_MODEL, PROMPT_VERSION)
+
+
+def _extract_key(digest: str, doc_type: str) -> str:
+    return cache_key("extract", digest, OCR_DPI, _ocr_settings(), OPENROUTER_MODEL, PROMPT_VERSION, doc_type)
+
+
+async def _classify(text: str, digest: str, bypass_cache: bool) -> str:
+    key = _classify_key(digest)
+    doc_type = None if bypass_cache else await cache_get_async("classify", key)
+    if doc_type is None:
+        with stage("classify"):
+            doc_type = await classify_document_agent(text)
+        # "other" is also the agent's failure fallback, so it is never cached
+        if OPENROUTER_API_KEY and doc_type != "other":
+            await cache_set_async("classify", key, doc_type)
+    return doc_type
+
+
+async def _extract_data(text: str, doc_type: str, digest: str, bypass_cache: bool):
+    key = _extract_key(digest, doc_type)
+    cached = None if bypass_cache else await cache_get_async("extract", key)
+    if cached is not None:
+        return DOCUMENT_MODELS[cached["type"]](**cached)
+    with stage("extract"):
+        extracted = await extract_data_agent(text, doc_type)
+    # The agent falls back to OtherDocumentData on errors; only cache real results
+    if OPENROUTER_API_KEY and extracted.type == doc_type != "other":
+        await cache_set_async("extract", key, extracted.model_dump(mode="json"))
+    return extracted
+
+
+async def _classify_and_extract(text: str, digest: str, bypass_cache: bool):
+    """Fused single-call path; shares cache entries with the two-step path."""
+    doc_type = None if bypass_cache else await cache_get_async(
+        "classify", _classify_key(digest))
+    if doc_type is not None:
+        return doc_type, await _extract_data(text, doc_type, digest, bypass_cache)
+    with stage("classify_extract"):
+        doc_type, extracted = await classify_and_extract_agent(text)
+    if OPENROUTER_API_KEY and extracted.type == doc_type != "other":
+        await cache_set_async("classify", _classify_key(digest), doc_type)
+        await cache_set_async("extract", _extract_key(digest, doc_type),
+                              extracted.model_dump(mode="json"))
+    return doc_type, extracted
+
+
+async def _extract_and_classify(path: str, digest: str, bypass_cache: bool) -> Tuple[str, str]:
+    """
+    Stream the pages of a PDF and classify it from the first CLASSIFY_FIRST_PAGES
+    while the remaining pages are still being extracted, so OCR overlaps the
+    LLM call. For SINGLE_PAGE_TYPES the remaining pages are never extracted.
+    Only the text of fully extracted documents is cached.
+    Returns the document text and type.
+    """
+    key = _text_key(digest)
+    text = None if bypass_cache else await cache_get_async("text", key)
+    if text is not None:
+        return text, await _classify(text, digest, bypass_cache)
+    doc_type = None if bypass_cache else await cache_get_async("classify", _classify_key(digest))
+    pages: List[str] = []
+    first_pages = asyncio.Event()
+
+    async def collect():
+        try:
+            with stage("extract_text"):
+                async with aclosing(iter_pages_async(path, first_batch=CLASSIFY_FIRST_PAGES)) as stream:
+                    async for _, page_text, _ in stream:
+                        pages.append(page_text)
+                        if len(pages) == CLASSIFY_FIRST_PAGES:
+                            first_pages.set()
+        finally:
+            first_pages.set()
+
+    collector = asyncio.create_task(collect())
+    try:
+        await first_pages.wait()
+        if collector.done():
+            await collector
+        head = "\n".join(pages).strip()
+        if doc_type is None and head:
+            doc_type = await _classify(head, digest, bypass_cache)
+        if doc_type in SINGLE_PAGE_TYPES and head and not collector.done():
+            collector.cancel()
+            with suppress(asyncio.CancelledError):
+                await collector
+            return "\n".join(pages).strip(), doc_type
+        await collector
+    finally:
+        collector.cancel()
+    text = "\n".join(pages).strip()
+    if not text:
+        raise Exception(
+            "PDF extraction failed: No text extracted from PDF (even with OCR).")
+    await cache_set_async("text", key, text)
+    if doc_type is None:
+        doc_type = await _classify(text, digest, bypass_cache)
+    return text, doc_type
+
+
+async def _process_document(upload: SpooledUpload, claim_slots: asyncio.Semaphore,
+                            claim_id: str, bypass_cache: bool = False, timings: bool = False,
+                            propagate: Tuple[type, ...] = ()) -> Tuple[dict, Optional[PendingDocument]]:
+    """
+    Run extract -> classify -> extract data for one PDF spooled to disk, then
+    look its text up among the documents of other claims.
+    Each stage is cached by the SHA-256 of the PDF bytes.
+    Failures are reported as an error entry instead of failing the whole claim;
+    only extraction backpressure and the exception types in propagate are raised.
+    With timings, the document's stage breakdown is added under "timings".
+    Returns the doc dict and the entry to add to the duplicate index once
+    the claim completes (None when there is nothing to index).
+    """
+    trace = start_trace()
+    pending = None
+    try:
+        doc, pending = await _process_document_stages(upload, claim_slots, claim_id, bypass_cache)
+        DOCUMENTS.inc(doc["type"])
+    except (ExtractionQueueFull, *propagate):
+        raise
+    except Exception as e:
+        DOCUMENT_ERRORS.inc(type(e).__name__)
+        doc = {"type": "error", "filename": upload.filename, "error": str(e)}
+    if timings:
+        doc["timings"] = trace
+    return doc, pending
+
+
+async def _process_document_stages(upload: SpooledUpload, claim_slots: asyncio.Semaphore,
+                                   claim_id: str, bypass_cache: bool) -> Tuple[dict, Optional[PendingDocument]]:
+    waiting = time.perf_counter()
+    async with claim_slots, _global_doc_slots:
+        observe_stage("queue_wait", time.perf_counter() - waiting)
+        digest = upload.sha256
+        if FUSED_EXTRACTION:
+            text = await _extract_text(upload.path, digest, bypass_cache)
+            doc_type, extracted = await _classify_and_extract(
+                text, digest, bypass_cache)
+        else:
+            text, doc_type = await _extract_and_classify(
+                upload.path, digest, bypass_cache)
+            extracted = await _extract_data(
+                text, doc_type, digest, bypass_cache)
+        doc = _to_doc_dict(doc_type, extracted)
+        with stage("duplicate_check"):
+            duplicates, signature = await asyncio.to_thread(check_document, claim_id, text)
+        if duplicates:
+            doc["duplicate_of"] = duplicates
+        pending = None if signature is None else (upload.filename, doc["type"], digest, signature)
+        return doc, pending
+
+
+async def _iter_claim_documents(sources: List[SpooledUpload], claim_id: str,
+                                bypass_cache: bool = False, timings: bool = False,
+                                propagate: Tuple[type, ...] = ()):
+    """
+    Process the spooled documents of one claim concurrently, yielding
+    (index, doc_dict, pending duplicate-index entry) as each document
+    finishes. Raises ExtractionQueueFull
+    under backpressure; if iteration stops, remaining documents are cancelled
+    and awaited, so none is still reading its file once this returns.
+    """
+    claim_slots = asyncio.Semaphore(CLAIM_DOC_CONCURRENCY)
+
+    async def run(index: int, upload: SpooledUpload):
+        return (index, *await _process_document(
+            upload, claim_slots, claim_id, bypass_cache, timings, propagate))
+
+    tasks = [asyncio.create_task(run(i, upload))
+             for i, upload in enumerate(sources)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _index_claim(claim_id: str, pending: List[Optional[PendingDocument]]):
+    """Add a completed claim's documents to the duplicate index."""
+    with stage("duplicate_index"):
+        await asyncio.to_thread(add_documents, claim_id, [p for p in pending if p is not None])
+
+
+async def _run_claim(sources: List[SpooledUpload], bypass_cache: bool = False,
+                     timings: bool = False, claim_id: Optional[str] = None,
+                     propagate: Tuple[type, ...] = ()) -> dict:
+    """
+    Process the spooled documents of one claim concurrently and build
+    the claim response. Raises ExtractionQueueFull under backpressure,
+    and any exception in propagate instead of reporting it per document.
+    """
+    claim_id = claim_id or uuid.uuid4().hex
+    started = time.perf_counter()
+    documents = [None] * len(sources)
+    pending = []
+    async for index, doc, entry in _iter_claim_documents(
+            sources, claim_id, bypass_cache, timings, propagate):
+        documents[index] = doc
+        pending.append(entry)
+    await _index_claim(claim_id, pending)
+    elapsed = time.perf_counter() - started
+    CLAIM_SECONDS.observe(elapsed)
+    result = {"claim_id": claim_id, "documents": documents, **claim_verdict(documents)}
+    if timings:
+        result["timings"] = {"total_ms": round(elapsed * 1000, 2)}
+    return result
+
+
+async def _stream_claim(sources: List[SpooledUpload], bypass_cache: bool = False,
+                        sse: bool = False, timings: bool = False, claim_id: Optional[str] = None):
+    """
+    Yield one NDJSON line (or SSE event) per document as soon as it is ready,
+    then a final "claim" event with the validation block and claim decision.
+    Only the extracted fields are kept between events, for cross-document validation.
+    The spooled files are deleted when the stream ends, however it ends.
+    """
+    def encode(event: str, payload: dict) -> str:
+        if sse:
+            return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+        return json.dumps({"event": event, **payload}, default=str) + "\n"
+
+    claim_id = claim_id or uuid.uuid4().hex
+    started = time.perf_counter()
+    documents = [None] * len(sources)
+    pending = []
+    try:
+        try:
+            # Closed before the files go, so no document is still reading them
+            async with aclosing(_iter_claim_documents(
+                    sources, claim_id, bypass_cache, timings)) as results:
+                async for index, doc, entry in results:
+                    documents[index] = doc
+                    pending.append(entry)
+                    yield encode("document", {"index": index, "document": doc})
+            await _index_claim(claim_id, pending)
+        except ExtractionQueueFull as e:
+            yield encode("error", {"status_code": 503, "detail": str(e)})
+            return
+        except Exception as e:
+            yield encode("error", {"status_code": 500, "detail": f"Internal processing error: {str(e)}"})
+            return
+        elapsed = time.perf_counter() - started
+        CLAIM_SECONDS.observe(elapsed)
+        verdict = {"claim_id": claim_id, **claim_verdict(documents)}
+        if timings:
+            verdict["timings"] = {"total_ms": round(elapsed * 1000, 2)}
+        yield encode("claim", verdict)
+    finally:
+        # Not a response BackgroundTask: Starlette skips those when the client disconnects
+        discard(sources)
+
+
+async def _run_batch_job(files: List[str], job_id: str) -> dict:
+    """
+    Batch worker handler: process one queued claim from PDFs on disk.
+    An extraction timeout fails the whole attempt so the queue retries it
+    with backoff rather than storing a claim of error entries as completed.
+    """
+    sources = await asyncio.gather(*[spooled_from_path(path) for path in files])
+    return await _run_claim(list(sources), claim_id=job_id, propagate=(ExtractionTimeout,))
+
+
+async def _spool_uploads(files: List[UploadFile]) -> List[SpooledUpload]:
+    """Spool every upload to disk, removing the ones already written on failure."""
+    uploads = []
+    try:
+        for file in files:
+            uploads.append(await spool_upload(file))
+    except UploadTooLarge as e:
+        discard(uploads)
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        discard(uploads)
+        raise
+    return uploads
 
 
 @app.post("/process-claim")
-async def process_claim(files: List[UploadFile] = File(...)):
+async def process_claim(files: List[UploadFile] = File(...),
+                        stream: bool = False,
+                        timings: bool = False,
+                        claim_id: Optional[str] = Form(None),
+                        x_cache_bypass: Optional[str] = Header(None),
+                        accept: Optional[str] = Header(None)):
     """
     Main endpoint to process claim with multiple PDF files
     Returns output in the preferred JSON format.
+    With `?stream=true`, streams one NDJSON event per document as it completes
+    followed by a final "claim" event (Server-Sent Events when the client
+    accepts `text/event-stream`).
+    Send `X-Cache-Bypass: 1` to ignore cached results (fresh results are still stored).
+    With `?timings=true`, each document carries its per-stage timing breakdown,
+    page counts and LLM token usage.
+    Send the same `claim_id` form field when resubmitting a claim so its
+    documents are not reported as duplicates of the earlier attempt; one is
+    generated otherwise. Documents join the duplicate index only once the
+    whole claim has completed.
     """
     if not files:
         raise HTTPException(
@@ -30,72 +465,144 @@ async def process_claim(files: List[UploadFile] = File(...)):
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(
                 status_code=400, detail=f"Only PDF files are supported. Got: {file.filename}")
+    bypass_cache = (x_cache_bypass or "").lower() in ("1", "true", "yes")
+    if claim_id is not None and not 0 < len(claim_id.strip()) <= 128:
+        raise HTTPException(
+            status_code=400, detail="claim_id must be 1-128 characters")
+    claim_id = claim_id.strip() if claim_id else None
+    if stream:
+        # Refuse up front; once streaming starts the status code is fixed
+        if pending_jobs() >= OCR_MAX_PENDING:
+            raise HTTPException(status_code=503, detail="Extraction queue is full",
+                                headers={"Retry-After": "5"})
+        uploads = await _spool_uploads(files)
+        sse = "text/event-stream" in (accept or "")
+        return StreamingResponse(
+            _stream_claim(uploads, bypass_cache, sse, timings, claim_id),
+            media_type="text/event-stream" if sse else "application/x-ndjson")
+    uploads = await _spool_uploads(files)
     try:
-        documents = []
-        doc_types_found = set()
-        for file in files:
-            text = await extract_text_from_pdf(file)
-            if not text:
-                continue
-            doc_type = await classify_document_agent(text)
-            doc_types_found.add(doc_type)
-            extracted = await extract_data_agent(text, doc_type)
-            # Convert extracted object to dict and filter only required fields
-            if doc_type == "bill":
-                doc_dict = {
-                    "type": "bill",
-                    "hospital_name": getattr(extracted, "hospital_name", None),
-                    "total_amount": getattr(extracted, "total_amount", None),
-                    "date_of_service": str(getattr(extracted, "bill_date", None))[:10] if getattr(extracted, "bill_date", None) else None
-                }
-            elif doc_type == "discharge_summary":
-                doc_dict = {
-                    "type": "discharge_summary",
-                    "patient_name": getattr(extracted, "patient_name", None),
-                    "diagnosis": getattr(extracted, "diagnosis", None),
-                    "admission_date": str(getattr(extracted, "admission_date", None))[:10] if getattr(extracted, "admission_date", None) else None,
-                    "discharge_date": str(getattr(extracted, "discharge_date", None))[:10] if getattr(extracted, "discharge_date", None) else None
-                }
-            elif doc_type == "id_card":
-                doc_dict = {
-                    "type": "id_card",
-                    "patient_name": getattr(extracted, "patient_name", None),
-                    "patient_id": getattr(extracted, "patient_id", None),
-                    "insurance_provider": getattr(extracted, "insurance_provider", None),
-                    "policy_number": getattr(extracted, "policy_number", None),
-                    "validity_date": str(getattr(extracted, "validity_date", None))[:10] if getattr(extracted, "validity_date", None) else None
-                }
-            else:
-                doc_dict = {"type": "other", "content_summary": getattr(
-                    extracted, "content_summary", None)}
-            documents.append(doc_dict)
-        # Validation: check for missing document types
-        required_types = {"bill", "discharge_summary"}
-        missing_documents = list(required_types - doc_types_found)
-        discrepancies = []  # Add logic for cross-checks if needed
-        # Claim decision logic
-        if not missing_documents and not discrepancies:
-            status = "approved"
-            reason = "All required documents present and data is consistent"
-        else:
-            status = "rejected"
-            reason = "Missing required documents or found discrepancies"
-        return {
-            "documents": documents,
-            "validation": {
-                "missing_documents": missing_documents,
-                "discrepancies": discrepancies
-            },
-            "claim_decision": {
-                "status": status,
-                "reason": reason
-            }
-        }
+        return await _run_claim(uploads, bypass_cache, timings, claim_id)
     except HTTPException:
         raise
+    except ExtractionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Internal processing error: {str(e)}")
+    finally:
+        discard(uploads)
+
+
+def _manifest_claims(manifest: str) -> List[List[str]]:
+    """
+    Parse a batch manifest: {"claims": [{"files": [...]}, ...]} or a list of
+    file lists, with paths relative to BATCH_ROOT.
+    """
+    try:
+        data = json.loads(manifest)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid manifest: {e}")
+    if isinstance(data, dict):
+        data = data.get("claims", [])
+    if not isinstance(data, list):
+        raise HTTPException(
+            status_code=400, detail='Invalid manifest: expected a list of claims or {"claims": [...]}')
+    root = Path(BATCH_ROOT).resolve()
+    claims = []
+    for claim in data:
+        names = claim.get("files", []) if isinstance(claim, dict) else claim
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise HTTPException(
+                status_code=400, detail="Invalid manifest: each claim needs a list of file paths")
+        paths = []
+        for name in names:
+            path = (root / name).resolve()
+            if root not in path.parents or not path.is_file():
+                raise HTTPException(
+                    status_code=400, detail=f"Manifest file not found under {BATCH_ROOT}: {name}")
+            if path.suffix.lower() != ".pdf":
+                raise HTTPException(
+                    status_code=400, detail=f"Only PDF files are supported. Got: {name}")
+            paths.append(str(path))
+        if not paths:
+            raise HTTPException(
+                status_code=400, detail="Every claim in the manifest needs at least one file")
+        claims.append(paths)
+    return claims
+
+
+@app.post("/claims/batch", status_code=202)
+async def submit_claims_batch(files: List[UploadFile] = File(None),
+                              claim_keys: List[str] = Form(None),
+                              manifest: Optional[str] = Form(None)):
+    """
+    Queue many claims for background processing and return their job ids.
+    Uploaded files are grouped into claims by the parallel `claim_keys` form
+    field (all uploads form one claim without it); `manifest` adds claims
+    made of PDFs already under BATCH_ROOT. Poll GET /claims/{job_id} for results.
+    """
+    files = files or []
+    if not files and not manifest:
+        raise HTTPException(
+            status_code=400, detail="Provide files or a manifest")
+    if claim_keys and len(claim_keys) != len(files):
+        raise HTTPException(
+            status_code=400, detail="claim_keys must have one entry per file")
+    for file in files:
+        if not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(
+                status_code=400, detail=f"Only PDF files are supported. Got: {file.filename}")
+    manifest_claims = _manifest_claims(manifest) if manifest else []
+    job_ids = []
+    grouped = {}
+    for i, file in enumerate(files):
+        grouped.setdefault(claim_keys[i] if claim_keys else "", []).append(file)
+    spool_dirs = []
+    spooled = []
+    try:
+        for group in grouped.values():
+            spool_dir = os.path.join(BATCH_SPOOL_DIR, uuid.uuid4().hex)
+            spool_dirs.append(spool_dir)
+            paths = []
+            for i, file in enumerate(group):
+                upload = await spool_upload(file, directory=spool_dir)
+                path = os.path.join(
+                    spool_dir, f"{i}_{os.path.basename(file.filename)}")
+                os.replace(upload.path, path)
+                paths.append(path)
+            spooled.append((paths, spool_dir))
+        for paths, spool_dir in spooled:
+            job_ids.append(enqueue(paths, spool_dir=spool_dir))
+            # Queued: the job's worker owns the directory from now on
+            spool_dirs.remove(spool_dir)
+    except UploadTooLarge as e:
+        for spool_dir in spool_dirs:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        for spool_dir in spool_dirs:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+        raise
+    for paths in manifest_claims:
+        job_ids.append(enqueue(paths))
+    return {"jobs": [{"job_id": job_id, "status": "queued"} for job_id in job_ids]}
+
+
+@app.post("/claims/revalidate")
+async def revalidate_claims():
+    """Re-run cross-document validation over every completed batch claim and store the new verdicts"""
+    return await asyncio.to_thread(revalidate_completed_jobs)
+
+
+@app.get("/claims/{job_id}")
+async def get_claim_job(job_id: str):
+    """Status and, once completed, the result of a batch claim job"""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
 
 
 @app.get("/health")
@@ -103,6 +610,39 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now()}
 
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until warm-up has finished and the OCR binaries are present"""
+    ready, report = readiness()
+    return JSONResponse(status_code=200 if ready else 503, content=report)
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Cache hit/miss counters per pipeline stage"""
+    return cache_stats()
+
+
+@app.get("/classifier/stats")
+async def get_classifier_stats():
+    """How often the local classifier answered without calling the LLM"""
+    return classifier_stats()
+
+
+@app.get("/extraction/stats")
+async def get_extraction_stats():
+    """Average document tokens sent per extraction prompt"""
+    return context_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Stage latency histograms, page, token and fallback counters in Prometheus text format"""
+    OCR_PENDING.set(pending_jobs())
+    return PlainTextResponse(render_metrics(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
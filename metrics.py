@@ -0,0 +1,204 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Histogram bucket upper bounds for durations, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                    0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_registry: List["Counter"] = []
+# Per-document breakdown of the stages run in the current task (see start_trace)
+_trace: ContextVar[Optional[dict]] = ContextVar("claim_trace", default=None)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels, rendered in Prometheus text format."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        with _lock:
+            self._values[label_values] = self._values.get(
+                label_values, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        for values, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Point-in-time value, usually set right before a scrape."""
+    kind = "gauge"
+
+    def set(self, value: float, *label_values):
+        with _lock:
+            self._values[label_values] = value
+
+
+class Histogram(Counter):
+    """Bucketed distribution with _sum and _count series."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values):
+        # Buckets are stored per-slot and made cumulative when rendered
+        slot = bisect_left(self.buckets, value)
+        with _lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self) -> Iterator[str]:
+        for values, (slots, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float("inf"),), slots):
+                cumulative += hits
+                le = "+Inf" if bound == float("inf") else _format_value(float(bound))
+                bucket_labels = _format_labels(self.labels, values, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            labels = _format_labels(self.labels, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+STAGE_SECONDS = Histogram(
+    "claim_stage_duration_seconds",
+    "Time spent in each pipeline stage (rasterize/preprocess/tesseract are per page, in the OCR worker)",
+    ("stage",))
+CLAIM_SECONDS = Histogram(
+    "claim_duration_seconds", "Time to process all documents of a claim")
+DOCUMENTS = Counter(
+    "claim_documents_total", "Documents processed, by resulting type", ("type",))
+DOCUMENT_ERRORS = Counter(
+    "claim_document_errors_total", "Documents that failed, by exception type", ("error",))
+PAGES = Counter(
+    "pdf_pages_total", "PDF pages extracted, by method", ("method",))
+LLM_REQUESTS = Counter(
+    "llm_requests_total", "LLM chat completion requests, by outcome", ("outcome",))
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported in LLM response usage", ("kind",))
+FALLBACKS = Counter(
+    "agent_fallbacks_total", "Agent calls that fell back to a default result", ("agent", "reason"))
+OCR_PENDING = Gauge(
+    "ocr_pending_documents", "Documents queued or being extracted in the OCR pool")
+
+
+def start_trace() -> dict:
+    """
+    Start a per-document timing breakdown in the current context. Stages,
+    page counts and LLM token usage recorded afterwards in this task (and
+    tasks it spawns) are added to the returned dict.
+    """
+    trace = {"stages_ms": {}}
+    _trace.set(trace)
+    return trace
+
+
+def _add_to_trace(key: str, amount: float):
+    trace = _trace.get()
+    if trace is not None:
+        trace[key] = trace.get(key, 0) + amount
+
+
+def observe_stage(name: str, seconds: float):
+    """Record a stage duration measured elsewhere (e.g. inside a pool worker)."""
+    STAGE_SECONDS.observe(seconds, name)
+    trace = _trace.get()
+    if trace is not None:
+        stages = trace["stages_ms"]
+        stages[name] = round(stages.get(name, 0) + seconds * 1000, 2)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as pipeline stage `name` (also when it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def record_pages(total: int, ocr: int):
+    """Count pages read from the text layer and pages that needed OCR."""
+    PAGES.inc("text_layer", amount=total - ocr)
+    PAGES.inc("ocr", amount=ocr)
+    _add_to_trace("pages", total)
+    _add_to_trace("ocr_pages", ocr)
+
+
+def record_abandoned_ocr_page():
+    """Count a page OCR'd after its document was abandoned (timeout or early stop)."""
+    PAGES.inc("ocr_abandoned")
+
+
+def record_llm_usage(usage: Optional[dict]):
+    """Count the prompt/completion tokens of one successful LLM response."""
+    LLM_REQUESTS.inc("ok")
+    _add_to_trace("llm_calls", 1)
+    usage = usage or {}
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if tokens:
+            LLM_TOKENS.inc(kind, amount=tokens)
+            _add_to_trace(f"{kind}_tokens", tokens)
+
+
+def record_llm_error(error: BaseException):
+    """Count a failed LLM request by exception type."""
+    LLM_REQUESTS.inc(type(error).__name__)
+    _add_to_trace("llm_errors", 1)
+
+
+def record_fallback(agent: str, reason):
+    """Count an agent falling back to a default result; reason is a label or exception."""
+    if isinstance(reason, BaseException):
+        reason = type(reason).__name__
+    FALLBACKS.inc(agent, reason)
+    trace = _trace.get()
+    if trace is not None:
+        trace.setdefault("fallbacks", []).append(f"{agent}:{reason}")
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric._samples())
+    return "\n".join(lines) + "\n"
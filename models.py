@@ -1,27 +1,29 @@
 from typing import List, Optional, Union, Literal
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, AliasChoices
 
 class BillData(BaseModel):
     type: Literal["bill"] = "bill"
     hospital_name: str
-    patient_name: str
+    patient_name: Optional[str] = None
     patient_id: Optional[str] = None
-    bill_number: str
-    bill_date: datetime
+    bill_number: Optional[str] = None
+    # The extraction prompt asks for "date_of_service"
+    bill_date: Optional[datetime] = Field(
+        None, validation_alias=AliasChoices("bill_date", "date_of_service"))
     total_amount: float
     services: List[str] = []
     
 class DischargeSummaryData(BaseModel):
     type: Literal["discharge_summary"] = "discharge_summary"
-    hospital_name: str
+    hospital_name: Optional[str] = None
     patient_name: str
     patient_id: Optional[str] = None
     admission_date: datetime
     discharge_date: datetime
     diagnosis: str
-    treatment_summary: str
-    doctor_name: str
+    treatment_summary: Optional[str] = None
+    doctor_name: Optional[str] = None
 
 class IDCardData(BaseModel):
     type: Literal["id_card"] = "id_card"
@@ -36,6 +38,14 @@ class OtherDocumentData(BaseModel):
     document_title: Optional[str] = None
     content_summary: str
 
+# Extraction model for each document type returned by the classifier
+DOCUMENT_MODELS = {
+    "bill": BillData,
+    "discharge_summary": DischargeSummaryData,
+    "id_card": IDCardData,
+    "other": OtherDocumentData,
+}
+
 class ValidationResult(BaseModel):
     is_valid: bool
     errors: List[str] = []
@@ -46,4 +56,4 @@ class ClaimDecision(BaseModel):
     reason: str
     confidence_score: float = Field(ge=0.0, le=1.0)
     extracted_data: List[Union[BillData, DischargeSummaryData, IDCardData, OtherDocumentData]]
-    validation_results: List[ValidationResult]
\ No newline at end of file
+    validation_results: List[ValidationResult]
\ No newline at end of file
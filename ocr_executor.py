@@ -0,0 +1,222 @@
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import suppress
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pdf_text_extractor import scan_text_layer_range, ocr_page_timed, load_extraction_modules, OCR_DPI, PdfSource
+from metrics import stage, observe_stage, record_pages, record_abandoned_ocr_page
+
+# Worker processes used for text-layer scans and per-page OCR
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+# Maximum number of documents queued or in flight before new work is refused
+OCR_MAX_PENDING = int(os.getenv("OCR_MAX_PENDING", str(OCR_WORKERS * 4)))
+# Wall-clock limit for extracting a single document, in seconds
+OCR_JOB_TIMEOUT = float(os.getenv("OCR_JOB_TIMEOUT", "120"))
+# Pages per text-layer scan job; pages are yielded batch by batch, not after the whole document
+TEXT_LAYER_BATCH_PAGES = max(1, int(os.getenv("TEXT_LAYER_BATCH_PAGES", "8")))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_workers = 0
+_pending = 0
+
+
+class ExtractionQueueFull(Exception):
+    """Raised when the extraction queue is at OCR_MAX_PENDING."""
+
+
+class ExtractionTimeout(Exception):
+    """Raised when a document takes longer than OCR_JOB_TIMEOUT to extract."""
+
+
+def start_extraction_pool(workers: int = OCR_WORKERS) -> ProcessPoolExecutor:
+    """Start the shared OCR process pool (called from the FastAPI lifespan)."""
+    global _executor, _workers
+    if _executor is None:
+        _workers = max(1, workers)
+        _executor = ProcessPoolExecutor(max_workers=_workers)
+    return _executor
+
+
+async def prime_extraction_pool() -> Dict[str, float]:
+    """
+    Spawn the pool workers and import the extraction modules in each of them,
+    so the first document pays for neither. Returns the slowest import per module, in ms.
+    """
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*[
+        loop.run_in_executor(_executor, load_extraction_modules)
+        for _ in range(max(_workers, 1))
+    ])
+    return {name: max(result[name] for result in results) for name in results[0]}
+
+
+def shutdown_extraction_pool():
+    """Stop the shared OCR process pool, cancelling queued work."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def pending_jobs() -> int:
+    """
+    Number of documents currently queued or being extracted, including
+    abandoned documents whose pages are still running in the pool.
+    """
+    return _pending
+
+
+class _DocumentSlot:
+    """
+    One OCR_MAX_PENDING slot, held until the document's consumer is done and
+    every pool task it submitted has finished. Cancelling a task that already
+    runs in a worker process does not stop it, so the slot outlives timeouts
+    and early closes until the pool is actually free of the document's work.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        global _pending
+        _pending += 1
+        self._loop = loop
+        self._holders = 1
+        self._pool_futures: Dict[asyncio.Future, Future] = {}
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        # Falls back to the default thread pool when the process pool was not started
+        if _executor is None:
+            return self._loop.run_in_executor(None, fn, *args)
+        future = _executor.submit(fn, *args)
+        self._holders += 1
+        future.add_done_callback(self._task_done)
+        wrapped = asyncio.wrap_future(future, loop=self._loop)
+        self._pool_futures[wrapped] = future
+        return wrapped
+
+    def abandon_page(self, wrapped: asyncio.Future):
+        """Cancel an OCR task; if it already runs, count its page once it finishes."""
+        wrapped.cancel()
+        future = self._pool_futures.get(wrapped)
+        if future is not None:
+            future.add_done_callback(
+                lambda f: f.cancelled() or f.exception() or record_abandoned_ocr_page())
+
+    def _task_done(self, _future):
+        # Runs on the executor's management thread
+        with suppress(RuntimeError):
+            self._loop.call_soon_threadsafe(self.release)
+
+    def release(self):
+        global _pending
+        self._holders -= 1
+        if self._holders == 0:
+            _pending -= 1
+
+
+async def _until(deadline: float, future: asyncio.Future, timeout: float):
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(future, timeout=max(deadline - loop.time(), 0))
+    except asyncio.TimeoutError:
+        raise ExtractionTimeout(
+            f"PDF extraction timed out after {timeout:.0f}s")
+
+
+async def iter_pages_async(source: PdfSource, dpi: int = OCR_DPI,
+                           timeout: float = OCR_JOB_TIMEOUT,
+                           first_batch: int = 0) -> AsyncIterator[Tuple[int, str, str]]:
+    """
+    Yield (page_index, text, source) in page order as soon as each page is
+    ready, source being "text_layer" or "ocr". The text layer is scanned in
+    batches of TEXT_LAYER_BATCH_PAGES (first_batch pages first when given),
+    the next batch while the current one is consumed; scanned pages are OCR'd
+    in the pool at most one per worker ahead of the consumer, so closing the
+    iterator early skips the remaining scans and OCR.
+    Pass a file path rather than bytes so the PDF is not pickled to every worker.
+    Raises ExtractionQueueFull when the pool is saturated and ExtractionTimeout on timeout.
+    A page already running in a worker is not killed on timeout or close; the
+    document counts towards OCR_MAX_PENDING until it finishes, and the page
+    is counted as pdf_pages_total{method="ocr_abandoned"}.
+    """
+    if _pending >= OCR_MAX_PENDING:
+        raise ExtractionQueueFull(
+            f"Extraction queue is full ({_pending} documents pending)")
+    loop = asyncio.get_running_loop()
+    slot = _DocumentSlot(loop)
+    deadline = loop.time() + timeout
+    in_flight: Dict[int, asyncio.Future] = {}
+    queued: deque = deque()
+    needs_ocr = set()
+    yielded = ocr_yielded = 0
+    ocr_seconds = 0.0
+    scanned = 0
+    next_scan = slot.submit(scan_text_layer_range, source, 0, first_batch or TEXT_LAYER_BATCH_PAGES)
+    try:
+        while next_scan is not None:
+            with stage("text_layer"):
+                pages, batch_ocr, total = await _until(deadline, next_scan, timeout)
+            first = scanned
+            scanned += len(pages)
+            # Scan the next batch while this one is yielded and OCR'd
+            next_scan = slot.submit(
+                scan_text_layer_range, source, scanned, scanned + TEXT_LAYER_BATCH_PAGES
+            ) if scanned < total else None
+            queued.extend(batch_ocr)
+            needs_ocr.update(batch_ocr)
+            for i, text in enumerate(pages, start=first):
+                origin = "text_layer"
+                if i in needs_ocr:
+                    # Keep the pool busy with the next scanned pages; workers open the path themselves
+                    while queued and len(in_flight) < max(_workers, 1):
+                        page = queued.popleft()
+                        in_flight[page] = slot.submit(ocr_page_timed, source, page, dpi)
+                    started = time.perf_counter()
+                    text, timings = await _until(deadline, in_flight.pop(i), timeout)
+                    ocr_seconds += time.perf_counter() - started
+                    for name, seconds in timings.items():
+                        observe_stage(name, seconds)
+                    origin = "ocr"
+                    ocr_yielded += 1
+                yielded += 1
+                yield i, text, origin
+    finally:
+        if next_scan is not None:
+            next_scan.cancel()
+        for future in in_flight.values():
+            slot.abandon_page(future)
+        if ocr_yielded:
+            # Time the consumer was kept waiting on OCR
+            observe_stage("ocr", ocr_seconds)
+        record_pages(yielded, ocr_yielded)
+        slot.release()
+
+
+async def extract_pages_async(source: PdfSource, dpi: int = OCR_DPI,
+                              timeout: float = OCR_JOB_TIMEOUT) -> Tuple[List[str], List[int]]:
+    """
+    Extract per-page text off the event loop (see iter_pages_async).
+    Returns the page texts and the 0-based indices of the pages that were OCR'd.
+    Raises ExtractionQueueFull when the pool is saturated and ExtractionTimeout on timeout.
+    """
+    pages = []
+    ocr_pages = []
+    async for i, text, origin in iter_pages_async(source, dpi, timeout):
+        pages.append(text)
+        if origin == "ocr":
+            ocr_pages.append(i)
+    return pages, ocr_pages
+
+
+async def extract_text_async(source: PdfSource, dpi: int = OCR_DPI) -> str:
+    """
+    Async counterpart of pdf_text_extractor.extract_text_from_pdf backed by the process pool.
+    Raises Exception if no text could be extracted.
+    """
+    pages, _ = await extract_pages_async(source, dpi=dpi)
+    full_text = "\n".join(pages).strip()
+    if not full_text:
+        raise Exception(
+            "PDF extraction failed: No text extracted from PDF (even with OCR).")
+    return full_text
@@ -0,0 +1,203 @@
+import os
+import hashlib
+from typing import NamedTuple, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Binarization: "otsu" (global), "sauvola" (local, for faint or unevenly lit scans) or a fixed 0-255 level
+OCR_BINARIZE = os.getenv("OCR_BINARIZE", "otsu")
+# Percentiles of the gray histogram mapped to black and white by the contrast stretch
+OCR_STRETCH_LOW = float(os.getenv("OCR_STRETCH_LOW", "1"))
+OCR_STRETCH_HIGH = float(os.getenv("OCR_STRETCH_HIGH", "99"))
+# Sauvola window size in pixels (rounded up to odd) and sensitivity
+OCR_SAUVOLA_WINDOW = int(os.getenv("OCR_SAUVOLA_WINDOW", "31")) | 1
+OCR_SAUVOLA_K = float(os.getenv("OCR_SAUVOLA_K", "0.2"))
+# Optional passes: straighten skewed scans and drop isolated specks
+OCR_DESKEW = os.getenv("OCR_DESKEW", "0") == "1"
+OCR_DENOISE = os.getenv("OCR_DENOISE", "0") == "1"
+# Pick tesseract's --psm per page and upscale small text; OCR_PSM is used otherwise
+OCR_AUTO_LAYOUT = os.getenv("OCR_AUTO_LAYOUT", "1") == "1"
+OCR_PSM = int(os.getenv("OCR_PSM", "3"))
+# Text lines shorter than this many pixels are upscaled before OCR
+OCR_MIN_LINE_PX = int(os.getenv("OCR_MIN_LINE_PX", "24"))
+# Largest upscale factor; tesseract's work grows with its square
+OCR_MAX_UPSCALE = float(os.getenv("OCR_MAX_UPSCALE", "1.5"))
+_MAX_SKEW_DEGREES = 5.0
+_SKEW_STEP_DEGREES = 0.25
+_SAUVOLA_RANGE = 128.0
+# A text band taller than this share of the page means the row profile is unreliable
+_MAX_BAND_FRACTION = 0.1
+
+# Checked once here rather than on every page
+if OCR_BINARIZE not in ("otsu", "sauvola") and not (
+        OCR_BINARIZE.isdigit() and int(OCR_BINARIZE) <= 255):
+    raise ValueError(
+        f"OCR_BINARIZE must be 'otsu', 'sauvola' or a 0-255 level, got {OCR_BINARIZE!r}")
+
+# Short hash of every setting above that changes the OCR text, for cache keys
+OCR_SETTINGS_FINGERPRINT = hashlib.sha256(repr((
+    OCR_BINARIZE, OCR_STRETCH_LOW, OCR_STRETCH_HIGH, OCR_SAUVOLA_WINDOW, OCR_SAUVOLA_K,
+    OCR_DESKEW, OCR_DENOISE, OCR_AUTO_LAYOUT, OCR_PSM, OCR_MIN_LINE_PX, OCR_MAX_UPSCALE,
+)).encode()).hexdigest()[:12]
+
+
+class OcrPlan(NamedTuple):
+    """How tesseract should read a preprocessed page; lines == 0 means blank."""
+    psm: int
+    dpi: int
+    lines: int
+
+    def tesseract_config(self) -> str:
+        return f"--psm {self.psm} --dpi {self.dpi}"
+
+
+def _stretch_lut(hist: np.ndarray) -> np.ndarray:
+    """Lookup table mapping the low/high percentiles to 0/255."""
+    cumulative = np.cumsum(hist)
+    total = cumulative[-1]
+    low = int(np.searchsorted(cumulative, total * OCR_STRETCH_LOW / 100))
+    high = int(np.searchsorted(cumulative, total * OCR_STRETCH_HIGH / 100))
+    if high <= low:
+        return np.arange(256, dtype=np.uint8)
+    levels = (np.arange(256, dtype=np.float32) - low) * (255.0 / (high - low))
+    return np.clip(levels, 0, 255).astype(np.uint8)
+
+
+def otsu_threshold(hist: np.ndarray) -> int:
+    """Gray level maximizing the between-class variance of a 256-bin histogram."""
+    p = hist.astype(np.float64) / max(hist.sum(), 1)
+    omega = np.cumsum(p)
+    mu = np.cumsum(p * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mu[-1] * omega - mu) ** 2 / (omega * (1.0 - omega))
+    return int(np.argmax(np.nan_to_num(between)))
+
+
+def _box_mean(a: np.ndarray, window: int) -> np.ndarray:
+    """Mean over a window x window neighbourhood via separable running sums."""
+    padded = np.pad(a, window // 2, mode="edge")
+    running = np.cumsum(padded, axis=0, dtype=np.float32)
+    sums = running[window - 1:]
+    sums[1:] -= running[:-window]
+    running = np.cumsum(sums, axis=1, dtype=np.float32)
+    sums = running[:, window - 1:]
+    sums[:, 1:] -= running[:, :-window]
+    sums /= window * window
+    return sums
+
+
+def _sauvola_ink(gray: np.ndarray) -> np.ndarray:
+    """Ink mask from Sauvola's local threshold m * (1 + k * (s / R - 1))."""
+    a = gray.astype(np.float32)
+    mean = _box_mean(a, OCR_SAUVOLA_WINDOW)
+    a *= a
+    # Local variance, then the threshold, computed in place in one buffer
+    threshold = _box_mean(a, OCR_SAUVOLA_WINDOW)
+    threshold -= mean * mean
+    np.sqrt(np.maximum(threshold, 0, out=threshold), out=threshold)
+    threshold *= OCR_SAUVOLA_K / _SAUVOLA_RANGE
+    threshold += 1.0 - OCR_SAUVOLA_K
+    threshold *= mean
+    return gray <= threshold
+
+
+def _despeckle(ink: np.ndarray) -> np.ndarray:
+    """Drop ink pixels with fewer than two ink neighbours in their 3x3 window."""
+    padded = np.pad(ink, 1).view(np.uint8)
+    h, w = ink.shape
+    neighbours = np.zeros((h, w), dtype=np.uint8)
+    for dy in range(3):
+        for dx in range(3):
+            neighbours += padded[dy:dy + h, dx:dx + w]
+    return ink & (neighbours >= 3)
+
+
+def estimate_skew(ink: np.ndarray) -> float:
+    """
+    Skew angle in degrees (positive when text lines descend to the right),
+    found by maximizing the sharpness of the sheared row-ink profile.
+    """
+    ys, xs = np.nonzero(ink[::2, ::2])
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > 200_000:
+        keep = np.linspace(0, len(ys) - 1, 200_000).astype(np.int64)
+        ys, xs = ys[keep], xs[keep]
+    xs = xs.astype(np.float32)
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-_MAX_SKEW_DEGREES, _MAX_SKEW_DEGREES + 1e-6, _SKEW_STEP_DEGREES):
+        rows = np.rint(ys - xs * np.tan(np.radians(angle))).astype(np.int64)
+        counts = np.bincount(rows - rows.min())
+        score = float(np.dot(counts, counts))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def _text_lines(ink: np.ndarray) -> np.ndarray:
+    """Heights of the horizontal bands that contain text."""
+    row_ink = ink.sum(axis=1) >= max(2, ink.shape[1] // 500)
+    edges = np.diff(np.concatenate(([0], row_ink.view(np.int8), [0])))
+    heights = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    return heights[heights >= 3]
+
+
+def _plan(ink: np.ndarray, dpi: int) -> Tuple[OcrPlan, float]:
+    """Choose --psm and the upscale factor (and so the effective DPI) for a page."""
+    if not OCR_AUTO_LAYOUT:
+        return OcrPlan(OCR_PSM, dpi, 1), 1.0
+    heights = _text_lines(ink)
+    lines = len(heights)
+    if lines == 0:
+        return OcrPlan(OCR_PSM, dpi, 0), 1.0
+    if heights.max() > _MAX_BAND_FRACTION * ink.shape[0]:
+        # Skewed text or large graphics merge the bands; leave it to tesseract
+        return OcrPlan(OCR_PSM, dpi, lines), 1.0
+    scale = 1.0
+    line_px = float(np.median(heights))
+    if line_px < OCR_MIN_LINE_PX:
+        scale = max(min(OCR_MIN_LINE_PX / line_px, OCR_MAX_UPSCALE), 1.0)
+    if lines == 1:
+        psm = 7  # single text line
+    elif lines <= 3 or heights.sum() < 0.1 * ink.shape[0]:
+        psm = 11  # sparse text, e.g. ID cards and stamps
+    else:
+        psm = OCR_PSM
+    return OcrPlan(psm, int(round(dpi * scale)), lines), scale
+
+
+def preprocess_page(img: Image.Image, dpi: int) -> Tuple[Image.Image, OcrPlan]:
+    """
+    Contrast-stretch and binarize a page image as NumPy array operations,
+    optionally deskew and despeckle it, and plan how tesseract should read it.
+    With Otsu or a fixed level, stretch and threshold are fused into a single
+    lookup-table pass over the page. Returns a black-on-white 'L' image.
+    """
+    gray = np.asarray(img if img.mode == "L" else img.convert("L"))
+    hist = np.bincount(gray.ravel(), minlength=256)
+    lut = _stretch_lut(hist)
+    if OCR_BINARIZE == "sauvola":
+        ink = _sauvola_ink(np.take(lut, gray))
+    else:
+        if OCR_BINARIZE == "otsu":
+            # Histogram of the stretched page, without touching the pixels again
+            threshold = otsu_threshold(
+                np.bincount(lut, weights=hist, minlength=256))
+        else:
+            threshold = int(OCR_BINARIZE)
+        ink = np.take(lut <= threshold, gray)
+    if OCR_DENOISE:
+        ink = _despeckle(ink)
+    page = np.where(ink, np.uint8(0), np.uint8(255))
+    out = Image.fromarray(page, mode="L")
+    if OCR_DESKEW:
+        angle = estimate_skew(ink)
+        if abs(angle) >= _SKEW_STEP_DEGREES:
+            out = out.rotate(angle, resample=Image.NEAREST, fillcolor=255)
+            ink = np.asarray(out) == 0
+    plan, scale = _plan(ink, dpi)
+    if scale > 1.0:
+        out = out.resize((int(out.width * scale), int(out.height * scale)),
+                         resample=Image.BILINEAR)
+    return out, plan
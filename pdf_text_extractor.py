@@ -1,57 +1,173 @@
-import PyPDF2
-import pytesseract
-from pdf2image import convert_from_bytes
+import os
+import time
+import shutil
+import importlib
 import io
-from PIL import Image, ImageFilter, ImageOps, ImageEnhance
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
+# Rasterization settings for pages that have no usable text layer
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+# Pages whose text layer is shorter than this are treated as scanned
+MIN_TEXT_CHARS = 20
 
-def extract_text_from_pdf(file) -> str:
+
+# A PDF given either as raw bytes or as a path on disk
+PdfSource = Union[bytes, str, os.PathLike]
+
+# Heavy modules imported on first use (or by load_extraction_modules during warm-up)
+EXTRACTION_MODULES = ("PyPDF2", "PIL.Image", "pdf2image",
+                      "pytesseract", "ocr_preprocess")
+# External binaries OCR depends on: tesseract and poppler's rasterizer
+OCR_BINARIES = {"tesseract": "tesseract", "poppler": "pdftoppm"}
+
+
+def load_extraction_modules() -> Dict[str, float]:
+    """Import the heavy extraction dependencies. Returns milliseconds per module."""
+    timings = {}
+    for name in EXTRACTION_MODULES:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+    return timings
+
+
+def find_ocr_binaries() -> Dict[str, Optional[str]]:
+    """Path of each binary OCR needs, or None when it is not on PATH."""
+    return {name: shutil.which(binary) for name, binary in OCR_BINARIES.items()}
+
+
+def read_pdf_bytes(file) -> bytes:
+    """
+    Return the raw bytes of a PDF given bytes or a synchronous file-like object.
+    """
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file)
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return file.read()
+
+
+def scan_text_layer(source: PdfSource) -> Tuple[List[str], List[int]]:
+    """
+    Read the text layer of every page without rasterizing anything.
+    Paths are read through an open file handle rather than loaded into memory.
+    Returns the per-page texts and the indices of pages that need OCR.
+    """
+    pages, needs_ocr, _ = scan_text_layer_range(source)
+    return pages, needs_ocr
+
+
+def scan_text_layer_range(source: PdfSource, start: int = 0,
+                          stop: Optional[int] = None) -> Tuple[List[str], List[int], int]:
+    """
+    Like scan_text_layer, for pages start to stop (exclusive) only, so a long
+    document can be scanned in batches. Page indices are document-wide.
+    Returns the texts, the indices of pages that need OCR and the page count.
+    """
+    import PyPDF2
+    if isinstance(source, (bytes, bytearray)):
+        return _scan_reader(PyPDF2.PdfReader(io.BytesIO(source)), start, stop)
+    with open(source, "rb") as f:
+        return _scan_reader(PyPDF2.PdfReader(f), start, stop)
+
+
+def _scan_reader(reader, start: int, stop: Optional[int]) -> Tuple[List[str], List[int], int]:
+    pages = []
+    needs_ocr = []
+    total = len(reader.pages)
+    for i in range(start, total if stop is None else min(stop, total)):
+        text = (reader.pages[i].extract_text() or "").strip()
+        if len(text) > MIN_TEXT_CHARS:
+            pages.append(text)
+        else:
+            pages.append("")
+            needs_ocr.append(i)
+    return pages, needs_ocr, total
+
+
+def ocr_page(source: PdfSource, page_index: int, dpi: int = OCR_DPI) -> str:
+    """
+    Rasterize a single page (0-based index) in grayscale and OCR it.
+    Only this page is rendered by poppler; paths are handed to it directly.
+    """
+    text, _ = ocr_page_timed(source, page_index, dpi)
+    return text
+
+
+def ocr_page_timed(source: PdfSource, page_index: int, dpi: int = OCR_DPI) -> Tuple[str, Dict[str, float]]:
+    """
+    Like ocr_page, but also returns the seconds spent rasterizing (poppler),
+    preprocessing and in tesseract, measured inside the worker.
+    Tesseract gets a page segmentation mode and DPI chosen for the page,
+    and blank pages skip it entirely.
+    """
+    import pytesseract
+    from pdf2image import convert_from_bytes, convert_from_path
+    from ocr_preprocess import preprocess_page
+    timings = {"rasterize": 0.0, "preprocess": 0.0, "tesseract": 0.0}
+    started = time.perf_counter()
+    convert = convert_from_bytes if isinstance(
+        source, (bytes, bytearray)) else convert_from_path
+    images = convert(
+        source, dpi=dpi, first_page=page_index + 1, last_page=page_index + 1, grayscale=True)
+    timings["rasterize"] = time.perf_counter() - started
+    if not images:
+        return "", timings
+    started = time.perf_counter()
+    img, plan = preprocess_page(images[0], dpi)
+    timings["preprocess"] = time.perf_counter() - started
+    if not plan.lines:
+        return "", timings
+    started = time.perf_counter()
+    text = pytesseract.image_to_string(
+        img, config=plan.tesseract_config()).strip()
+    timings["tesseract"] = time.perf_counter() - started
+    return text, timings
+
+
+def iter_pages(file, dpi: int = OCR_DPI) -> Iterator[Tuple[int, str, str]]:
+    """
+    Yield (page_index, text, source) in page order, source being "text_layer"
+    or "ocr". Scanned pages are OCR'd only when the iteration reaches them,
+    so stopping early skips the OCR of the remaining pages.
+    Accepts a path, bytes or a file-like object.
+    """
+    source = file if isinstance(
+        file, (str, os.PathLike)) else read_pdf_bytes(file)
+    pages, needs_ocr = scan_text_layer(source)
+    needs_ocr = set(needs_ocr)
+    for i, text in enumerate(pages):
+        if i in needs_ocr:
+            yield i, ocr_page(source, i, dpi=dpi), "ocr"
+        else:
+            yield i, text, "text_layer"
+
+
+def extract_pages_from_pdf(file, dpi: int = OCR_DPI) -> Tuple[List[str], List[int]]:
+    """
+    Extract per-page text, OCR-ing only the pages without a usable text layer.
+    Accepts a path, bytes or a file-like object.
+    Returns the list of page texts and the 0-based indices of the pages that were OCR'd.
+    """
+    pages = []
+    ocr_pages = []
+    for i, text, source in iter_pages(file, dpi=dpi):
+        pages.append(text)
+        if source == "ocr":
+            ocr_pages.append(i)
+    return pages, ocr_pages
+
+
+def extract_text_from_pdf(file, dpi: int = OCR_DPI) -> str:
     """
     Extract text from a PDF file using PyPDF2 and OCR (pytesseract) if needed, per page.
-    Accepts a file-like object or bytes.
+    Accepts a path, a file-like object or bytes.
     Returns the extracted text as a string.
     Raises Exception if extraction fails.
     """
     try:
-        if hasattr(file, "seek"):
-            file.seek(0)
-        pdf_bytes = file.read() if not hasattr(
-            file, "read") or not callable(file.read) else file.read()
-        if hasattr(file, "read") and callable(file.read):
-            # If file is an async UploadFile, await read
-            try:
-                pdf_bytes = file.read()
-            except TypeError:
-                import asyncio
-                pdf_bytes = asyncio.run(file.read())
-        reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-        # Convert all pages to images for possible OCR
-        images = convert_from_bytes(pdf_bytes)
-        extracted_pages = []
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text() or ""
-            if text.strip() and len(text.strip()) > 20:
-                extracted_pages.append(text.strip())
-            else:
-                # Fallback to OCR for this page with preprocessing
-                if i < len(images):
-                    img = images[i]
-                    # Convert to grayscale
-                    img = img.convert("L")
-                    # Increase contrast
-                    img = ImageEnhance.Contrast(img).enhance(2.0)
-                    # Apply adaptive thresholding (binarization)
-                    img = img.point(lambda x: 0 if x < 180 else 255, '1')
-                    # Optionally denoise (unsharp mask)
-                    # Ensure mode is 'L' for pytesseract
-                    img = img.convert("L")
-                    img = img.filter(ImageFilter.UnsharpMask(
-                        radius=2, percent=150, threshold=3))
-                    ocr_text = pytesseract.image_to_string(img)
-                    extracted_pages.append(ocr_text.strip())
-                else:
-                    extracted_pages.append("")
-        full_text = "\n".join(extracted_pages)
+        pages, _ = extract_pages_from_pdf(file, dpi=dpi)
+        full_text = "\n".join(pages)
         if not full_text.strip():
             raise Exception("No text extracted from PDF (even with OCR).")
         return full_text.strip()
@@ -60,28 +176,18 @@ def extract_text_from_pdf(file) -> str:
 
 
 if __name__ == "__main__":
-    import os
     from pathlib import Path
     pdf_dir = Path("documents")
     pdf_files = list(pdf_dir.glob("*.pdf"))
     if not pdf_files:
         print("No PDF files found in 'documents' directory.")
     for pdf_file in pdf_files:
-        with open(pdf_file, "rb") as f:
-            class DummyFile:
-                def __init__(self, content):
-                    self._content = content
-
-                def read(self):
-                    return self._content
-
-                def seek(self, pos):
-                    pass
-            dummy_file = DummyFile(f.read())
-            try:
-                text = extract_text_from_pdf(dummy_file)
-                print(
-                    f"[TextParser] {pdf_file.name}: {len(text)} chars extracted")
-                print(f"  Preview: {text[:200]}...\n")
-            except Exception as e:
-                print(f"[TextParser] ERROR extracting {pdf_file.name}: {e}")
+        try:
+            pages, ocr_pages = extract_pages_from_pdf(str(pdf_file))
+            text = "\n".join(pages).strip()
+            print(
+                f"[TextParser] {pdf_file.name}: {len(text)} chars extracted, "
+                f"{len(pages)} pages, OCR'd pages: {ocr_pages}")
+            print(f"  Preview: {text[:200]}...\n")
+        except Exception as e:
+            print(f"[TextParser] ERROR extracting {pdf_file.name}: {e}")
@@ -0,0 +1,107 @@
+import json
+from collections import OrderedDict
+
+import pytest
+
+import cache
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(cache, "CACHE_DB_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(cache, "CACHE_TTL_SECONDS", 100.0)
+    monkeypatch.setattr(cache, "CACHE_PURGE_INTERVAL", 50.0)
+    monkeypatch.setattr(cache, "_db", None)
+    monkeypatch.setattr(cache, "_memory", OrderedDict())
+    monkeypatch.setattr(cache, "_touched", {})
+    monkeypatch.setattr(cache, "_stats", {})
+    monkeypatch.setattr(cache, "_disk_bytes", 0)
+    monkeypatch.setattr(cache, "_purged_at", 0.0)
+    yield clock
+    cache.close_cache()
+
+
+def disk_keys():
+    return {key for key, in cache._get_db().execute("SELECT key FROM cache")}
+
+
+def disk_bytes():
+    return cache._get_db().execute(
+        "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache").fetchone()[0]
+
+
+def test_value_is_served_from_memory_then_disk(clock):
+    cache.cache_set("text", "k", {"pages": ["a", "b"]})
+    assert cache.cache_get("text", "k") == {"pages": ["a", "b"]}
+    cache._memory.clear()
+    assert cache.cache_get("text", "k") == {"pages": ["a", "b"]}
+    assert cache.cache_get("text", "missing") is None
+    assert cache.cache_stats()["stages"]["text"] == {"memory_hits": 1, "disk_hits": 1, "misses": 1}
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache.cache_set("text", "k", "value")
+    clock.now += 99
+    assert cache.cache_get("text", "k") == "value"
+    clock.now += 1
+    assert cache.cache_get("text", "k") is None
+    cache._memory.clear()
+    assert cache.cache_get("text", "k") is None
+    # A fresh write replaces the expired entry
+    cache.cache_set("text", "k", "new")
+    assert cache.cache_get("text", "k") == "new"
+
+
+def test_expired_rows_are_purged_on_write_at_most_once_per_interval(clock, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_PURGE_INTERVAL", 500.0)
+    cache.cache_set("text", "old", "x" * 10)
+    clock.now += 120
+    cache.cache_set("text", "new", "y" * 10)
+    # Within the purge interval expired rows stay on disk, but are never served
+    assert disk_keys() == {"old", "new"}
+    assert cache.cache_get("text", "old") is None
+    clock.now += 380
+    cache.cache_set("text", "last", "z" * 10)
+    assert disk_keys() == {"last"}
+    assert cache.cache_stats()["disk_bytes"] == disk_bytes()
+
+
+def test_expired_rows_are_purged_when_the_cache_opens(clock):
+    cache.cache_set("text", "k", "value")
+    cache.close_cache()
+    clock.now += 200
+    cache.open_cache()
+    assert disk_keys() == set()
+    assert cache.cache_stats()["disk_bytes"] == 0
+
+
+def test_least_recently_used_rows_are_evicted_past_the_disk_limit(clock, monkeypatch):
+    value = "x" * 98
+    size = len(json.dumps(value))
+    monkeypatch.setattr(cache, "CACHE_MAX_DISK_MB", 150 * size / 1024 / 1024)
+    for i in range(150):
+        cache.cache_set("text", f"k{i}", value)
+        clock.now += 0.1
+    assert len(disk_keys()) == 150
+    # A disk hit makes k0 the most recently used; its accessed_at is only batched so far
+    cache._memory.clear()
+    assert cache.cache_get("text", "k0") == value
+    clock.now += 0.1
+    cache.cache_set("text", "k150", value)
+
+    keys = disk_keys()
+    assert "k0" in keys and "k150" in keys
+    assert "k1" not in keys and "k100" not in keys
+    assert len(keys) == 51
+    assert cache.cache_stats()["disk_bytes"] == disk_bytes() <= 150 * size
@@ -0,0 +1,133 @@
+from claim_validation import (
+    VALIDATION_BILL_GRACE_DAYS,
+    VALIDATION_MAX_CLAIM_AMOUNT,
+    claim_verdict,
+    validate_claim,
+    validate_claims,
+)
+from models import BillData
+
+
+def bill(**fields):
+    return {"type": "bill", "hospital_name": "City Hospital", "total_amount": 45000,
+            "date_of_service": "2024-04-05", **fields}
+
+
+def discharge(**fields):
+    return {"type": "discharge_summary", "patient_name": "John Doe", "diagnosis": "Dengue",
+            "admission_date": "2024-04-01", "discharge_date": "2024-04-10", **fields}
+
+
+def id_card(**fields):
+    return {"type": "id_card", "patient_name": "John Doe", "patient_id": "M1",
+            "insurance_provider": "Acme", "policy_number": "P1",
+            "validity_date": "2024-12-31", **fields}
+
+
+def rules(documents):
+    return sorted(d["rule"] for d in validate_claim(documents))
+
+
+def test_consistent_claim_has_no_discrepancies():
+    assert validate_claim([bill(), discharge(), id_card()]) == []
+
+
+def test_name_mismatch_between_discharge_summary_and_id_card():
+    found = validate_claim([bill(), discharge(), id_card(patient_name="Jane Doe")])
+    assert [d["rule"] for d in found] == ["name_mismatch"]
+    assert found[0]["documents"] == ["discharge_summary", "id_card"]
+
+
+def test_names_ignore_titles_case_and_word_order():
+    documents = [bill(), discharge(patient_name="Mr. JOHN DOE"), id_card(patient_name="Doe, John")]
+    assert rules(documents) == []
+
+
+def test_initial_matches_full_first_name():
+    assert rules([bill(), discharge(patient_name="J. Doe"), id_card()]) == []
+
+
+def test_different_first_names_with_same_initial_do_not_match():
+    assert rules([bill(), discharge(patient_name="Jane Doe"), id_card()]) == ["name_mismatch"]
+
+
+def test_bill_patient_name_is_checked_against_both_documents():
+    found = validate_claim([bill(patient_name="Richard Roe"), discharge(), id_card()])
+    assert sorted(tuple(d["documents"]) for d in found) == [
+        ("bill", "discharge_summary"), ("bill", "id_card")]
+
+
+def test_bill_model_carries_patient_name():
+    extracted = BillData(hospital_name="City Hospital", patient_name="Richard Roe",
+                         total_amount=45000, date_of_service="2024-04-05")
+    assert "name_mismatch" in rules([extracted, discharge(), id_card()])
+
+
+def test_missing_names_are_not_a_mismatch():
+    assert rules([bill(), discharge(patient_name=None), id_card(patient_name="")]) == []
+
+
+def test_discharge_before_admission():
+    assert rules([discharge(admission_date="2024-04-10", discharge_date="2024-04-01")]) == [
+        "discharge_before_admission"]
+
+
+def test_bill_date_before_admission():
+    assert rules([bill(date_of_service="2024-03-31"), discharge()]) == ["bill_date_outside_stay"]
+
+
+def test_bill_date_within_grace_days_after_discharge():
+    last_day = 10 + VALIDATION_BILL_GRACE_DAYS
+    assert rules([bill(date_of_service=f"2024-04-{last_day:02d}"), discharge()]) == []
+    assert rules([bill(date_of_service=f"2024-04-{last_day + 1:02d}"), discharge()]) == [
+        "bill_date_outside_stay"]
+
+
+def test_bill_date_unchecked_without_a_stay_or_with_a_bad_date():
+    assert rules([bill(date_of_service="2030-01-01"), discharge(admission_date=None)]) == []
+    assert rules([bill(date_of_service="not a date"), discharge()]) == []
+
+
+def test_non_positive_amount():
+    assert rules([bill(total_amount=0), discharge()]) == ["non_positive_amount"]
+    assert rules([bill(total_amount="-1,200"), discharge()]) == ["non_positive_amount"]
+
+
+def test_amount_over_limit_sums_the_claims_bills():
+    half = VALIDATION_MAX_CLAIM_AMOUNT / 2
+    assert rules([bill(total_amount=half), bill(total_amount=half), discharge()]) == []
+    assert rules([bill(total_amount=half), bill(total_amount=half + 1), discharge()]) == [
+        "amount_over_limit"]
+
+
+def test_policy_expired_before_earliest_bill_date():
+    documents = [bill(date_of_service="2024-04-09"), bill(date_of_service="2024-04-03"),
+                 discharge(), id_card(validity_date="2024-04-02")]
+    found = validate_claim(documents)
+    assert [d["rule"] for d in found] == ["policy_expired"]
+    assert "2024-04-03" in found[0]["detail"]
+
+
+def test_policy_valid_on_date_of_service():
+    assert rules([bill(), discharge(), id_card(validity_date="2024-04-05")]) == []
+
+
+def test_policy_expiry_falls_back_to_admission_date():
+    documents = [bill(date_of_service=None), discharge(), id_card(validity_date="2024-03-31")]
+    assert rules(documents) == ["policy_expired"]
+
+
+def test_claims_are_validated_independently():
+    good = [bill(), discharge(), id_card()]
+    bad = [bill(total_amount=-5), discharge(), id_card(patient_name="Jane Doe")]
+    results = validate_claims([good, bad, good])
+    assert results[0] == results[2] == []
+    assert sorted(d["rule"] for d in results[1]) == ["name_mismatch", "non_positive_amount"]
+
+
+def test_claim_verdict():
+    approved = claim_verdict([bill(), discharge()])
+    assert approved["claim_decision"]["status"] == "approved"
+    rejected = claim_verdict([bill(), {"type": "error", "error": "timed out"}])
+    assert rejected["claim_decision"]["status"] == "rejected"
+    assert rejected["validation"]["missing_documents"] == ["discharge_summary"]
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+
+from faiss_store import ChunkIndex, embed_texts, split_text
+
+DIM = 64
+
+
+def document(topic, words=300):
+    return " ".join(f"{topic} word{i}" for i in range(words))
+
+
+def vectors_size(index):
+    return os.path.getsize(os.path.join(index.directory, "vectors.f16"))
+
+
+def test_split_text_overlaps_start_at_a_word():
+    text = " ".join(f"w{i}" * (i % 4 + 1) for i in range(400))
+    chunks = split_text(text, chunk_size=100, chunk_overlap=20)
+    words = set(text.split())
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(set(chunk.split()) <= words for chunk in chunks)
+    # Each chunk starts with a whole word from the end of the previous one
+    assert all(b.split()[0] in a.split()[-4:] for a, b in zip(chunks, chunks[1:]))
+
+
+def test_index_reloads_from_disk(tmp_path):
+    index = ChunkIndex(str(tmp_path), dim=DIM)
+    bill = index.add_document(document("bill"))
+    summary = index.add_document(document("discharge"))
+    assert index.add_document(document("bill")) == bill
+    before = index.search("discharge word7", k=2)
+
+    reloaded = ChunkIndex(str(tmp_path), dim=DIM)
+    assert len(reloaded) == 2
+    assert reloaded.document_chunks(summary) == split_text(document("discharge"))
+    assert reloaded.search("discharge word7", k=2) == before
+    assert reloaded.search("bill word3", doc_id=bill)[0][2] in split_text(document("bill"))
+
+
+def test_orphaned_vectors_are_truncated_on_load(tmp_path):
+    index = ChunkIndex(str(tmp_path), dim=DIM)
+    doc_id = index.add_document(document("bill"))
+    expected = vectors_size(index)
+    # An add that crashed after writing its vectors but before its sidecar line
+    with open(tmp_path / "vectors.f16", "ab") as f:
+        f.write(embed_texts(["orphan"] * 3, DIM).tobytes())
+
+    reloaded = ChunkIndex(str(tmp_path), dim=DIM)
+    assert vectors_size(reloaded) == expected
+    added = reloaded.add_document(document("discharge"))
+    chunks = split_text(document("discharge"))
+    scores = reloaded.document_scores(added, chunks[0])
+    assert int(np.argmax(scores)) == 0
+    assert reloaded.document_chunks(doc_id) == split_text(document("bill"))
+
+
+def test_sidecar_without_vectors_starts_over(tmp_path):
+    ChunkIndex(str(tmp_path), dim=DIM).add_document(document("bill"))
+    os.remove(tmp_path / "vectors.f16")
+    reloaded = ChunkIndex(str(tmp_path), dim=DIM)
+    assert len(reloaded) == 0
+    assert not (tmp_path / "chunks.jsonl").exists()
+
+
+def test_least_recently_used_documents_are_evicted_and_files_rewritten(tmp_path):
+    index = ChunkIndex(str(tmp_path), dim=DIM, max_documents=3)
+    first, second, third = (index.add_document(document(topic))
+                            for topic in ("bill", "discharge", "card"))
+    index.document_chunks(first)
+    fourth = index.add_document(document("report"))
+
+    # Evicted down to 90% of max_documents, keeping the most recently used
+    assert len(index) == 2
+    reloaded = ChunkIndex(str(tmp_path), dim=DIM, max_documents=3)
+    assert list(reloaded._documents) == [first, fourth]
+    rows = len(split_text(document("bill"))) + len(split_text(document("report")))
+    assert vectors_size(reloaded) == rows * DIM * 2
+    for doc_id, topic in ((first, "bill"), (fourth, "report")):
+        chunks = split_text(document(topic))
+        assert reloaded.document_chunks(doc_id) == chunks
+        assert np.allclose(reloaded.document_scores(doc_id, chunks[1]),
+                           index.document_scores(doc_id, chunks[1]))
+    assert second not in reloaded._documents and third not in reloaded._documents
@@ -0,0 +1,168 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+import job_queue
+
+
+@pytest.fixture(autouse=True)
+def queue_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "BATCH_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(job_queue, "BATCH_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(job_queue, "_db", None)
+    monkeypatch.setattr(job_queue, "_wakeup", None)
+    yield
+    if job_queue._db is not None:
+        job_queue._db.close()
+
+
+class Busy(Exception):
+    pass
+
+
+def row(job_id):
+    return job_queue._get_db().execute(
+        "SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+
+def set_columns(job_id, **columns):
+    db = job_queue._get_db()
+    db.execute(f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in columns)} WHERE job_id = ?",
+               (*columns.values(), job_id))
+    db.commit()
+
+
+def run_workers(handler, until, backpressure=(), timeout=5.0):
+    """Run one worker until until() holds, then stop it."""
+    async def main():
+        job_queue.start_workers(handler, workers=1, backpressure=backpressure)
+        try:
+            deadline = time.monotonic() + timeout
+            while not until():
+                assert time.monotonic() < deadline, "timed out waiting for the worker"
+                await asyncio.sleep(0.02)
+        finally:
+            await job_queue.stop_workers()
+    asyncio.run(main())
+
+
+def test_claim_leases_the_job_and_counts_an_attempt():
+    job_id = job_queue.enqueue(["a.pdf"])
+    assert job_queue._claim_next()["job_id"] == job_id
+    leased = row(job_id)
+    assert (leased["status"], leased["owner"], leased["attempts"]) == ("running", job_queue._OWNER, 1)
+    assert leased["lease_until"] == pytest.approx(time.time() + job_queue.BATCH_LEASE_SECONDS, abs=5)
+    assert job_queue._claim_next() is None
+
+
+def test_expired_lease_is_claimed_again():
+    job_id = job_queue.enqueue(["a.pdf"])
+    job_queue._claim_next()
+    set_columns(job_id, owner="crashed", lease_until=time.time() - 1)
+    assert job_queue._claim_next()["job_id"] == job_id
+    assert (row(job_id)["owner"], row(job_id)["attempts"]) == (job_queue._OWNER, 2)
+
+
+def test_lost_lease_cannot_be_renewed_or_finished():
+    job_id = job_queue.enqueue(["a.pdf"])
+    job_queue._claim_next()
+    assert job_queue._renew_lease(job_id)
+    set_columns(job_id, owner="other")
+    assert not job_queue._renew_lease(job_id)
+    assert not job_queue._finish(job_id, "completed", result={})
+    assert row(job_id)["status"] == "running"
+
+
+def test_heartbeat_renews_the_lease(monkeypatch):
+    monkeypatch.setattr(job_queue, "BATCH_LEASE_SECONDS", 0.3)
+    job_id = job_queue.enqueue(["a.pdf"])
+    leases = []
+
+    async def handler(files, job_id):
+        for _ in range(3):
+            leases.append(row(job_id)["lease_until"])
+            await asyncio.sleep(0.2)
+        return {}
+
+    run_workers(handler, lambda: row(job_id)["status"] == "completed")
+    assert leases[0] < leases[1] < leases[2]
+
+
+def test_completed_job_stores_its_result_and_removes_the_spool(tmp_path):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    job_id = job_queue.enqueue([str(spool / "a.pdf")], spool_dir=str(spool))
+
+    async def handler(files, job_id):
+        return {"files": files}
+
+    run_workers(handler, lambda: row(job_id)["status"] == "completed")
+    job = job_queue.get_job(job_id)
+    assert (job["attempts"], job["files"]) == (1, ["a.pdf"])
+    assert job["result"] == {"files": [str(spool / "a.pdf")]}
+    assert row(job_id)["owner"] is None
+    assert not spool.exists()
+
+
+def test_failures_back_off_exponentially_then_fail(monkeypatch):
+    monkeypatch.setattr(job_queue, "BATCH_MAX_ATTEMPTS", 2)
+    job_id = job_queue.enqueue(["a.pdf"])
+
+    async def handler(files, job_id):
+        raise ValueError("bad pdf")
+
+    run_workers(handler, lambda: row(job_id)["error"] is not None)
+    retry = row(job_id)
+    assert (retry["status"], retry["attempts"]) == ("queued", 1)
+    assert retry["available_at"] - retry["updated_at"] == pytest.approx(2, abs=0.5)
+
+    set_columns(job_id, available_at=0)
+    run_workers(handler, lambda: row(job_id)["status"] == "failed")
+    assert job_queue.get_job(job_id)["attempts"] == 2
+    assert job_queue.get_job(job_id)["error"] == "bad pdf"
+
+
+def test_backpressure_requeues_without_using_an_attempt(monkeypatch):
+    monkeypatch.setattr(job_queue, "BATCH_BACKPRESSURE_DELAY", 30)
+    job_id = job_queue.enqueue(["a.pdf"])
+
+    async def handler(files, job_id):
+        raise Busy("extraction queue full")
+
+    run_workers(handler, lambda: row(job_id)["error"] is not None, backpressure=(Busy,))
+    requeued = row(job_id)
+    assert (requeued["status"], requeued["attempts"]) == ("queued", 0)
+    assert requeued["available_at"] == pytest.approx(time.time() + 30, abs=5)
+
+
+def test_shutdown_requeues_the_running_job_and_refunds_its_attempt():
+    job_id = job_queue.enqueue(["a.pdf"])
+
+    async def handler(files, job_id):
+        await asyncio.sleep(60)
+
+    run_workers(handler, lambda: row(job_id)["status"] == "running")
+    requeued = row(job_id)
+    assert (requeued["status"], requeued["attempts"], requeued["owner"]) == ("queued", 0, None)
+
+
+def test_database_errors_do_not_stop_the_worker(monkeypatch):
+    job_id = job_queue.enqueue(["a.pdf"])
+    claim_next = job_queue._claim_next
+    failures = []
+
+    def flaky_claim():
+        if not failures:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return claim_next()
+
+    monkeypatch.setattr(job_queue, "_claim_next", flaky_claim)
+
+    async def handler(files, job_id):
+        return {}
+
+    run_workers(handler, lambda: row(job_id)["status"] == "completed")
+    assert failures == [1]
@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import asyncio
+import tempfile
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, UploadFile
+
+# Largest accepted PDF, in megabytes
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "100"))
+UPLOAD_MAX_BYTES = int(UPLOAD_MAX_MB * 1024 * 1024)
+# Largest accepted upload request (all files together), enforced while the body streams in
+UPLOAD_MAX_REQUEST_BYTES = int(
+    float(os.getenv("UPLOAD_MAX_REQUEST_MB", str(UPLOAD_MAX_MB * 10))) * 1024 * 1024)
+# Directory for spooled uploads; the system temp dir when unset
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an uploaded file exceeds UPLOAD_MAX_MB."""
+
+
+class RequestTooLarge(HTTPException):
+    """Raised from the body stream once a request exceeds RequestSizeLimit's cap."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413,
+                         detail=f"Request body exceeds {max_bytes // (1024 * 1024)} MB")
+
+
+class RequestSizeLimit:
+    """
+    ASGI middleware capping POST bodies at max_bytes. A too large Content-Length
+    is refused before anything is read; bodies without one (chunked transfer)
+    are counted as they stream in and cut off with 413 once over the cap.
+
+    Multipart bodies are parsed (and spooled to Starlette's own temp files) before
+    the endpoint runs, so this cap is what bounds disk use per request; the
+    per-file UPLOAD_MAX_MB check in spool_upload only runs afterwards.
+    """
+
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            error = RequestTooLarge(self.max_bytes)
+            await send({"type": "http.response.start", "status": error.status_code,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body",
+                        "body": json.dumps({"detail": error.detail}).encode()})
+            return
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise RequestTooLarge(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class SpooledUpload(NamedTuple):
+    filename: str
+    path: str
+    sha256: str
+    size: int
+
+
+async def spool_upload(upload: UploadFile, directory: Optional[str] = UPLOAD_SPOOL_DIR,
+                       max_bytes: int = UPLOAD_MAX_BYTES) -> SpooledUpload:
+    """
+    Stream an upload into a named temp file in fixed-size chunks, hashing as it goes,
+    so the PDF is never held in memory as a whole. The caller owns (and deletes) the file.
+    Raises UploadTooLarge as soon as max_bytes is exceeded.
+    Starlette has already spooled the upload once while parsing the form, so
+    each PDF is written to disk twice; see RequestSizeLimit.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(
+            f"{upload.filename} exceeds the {max_bytes / (1024 * 1024):g} MB upload limit")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    out = tempfile.NamedTemporaryFile(
+        suffix=".pdf", dir=directory, delete=False)
+    try:
+        with out:
+            while True:
+                chunk = await upload.read(_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(
+                        f"{upload.filename} exceeds the {max_bytes / (1024 * 1024):g} MB upload limit")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.unlink(out.name)
+        raise
+    return SpooledUpload(upload.filename, out.name, digest.hexdigest(), size)
+
+
+def _file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+async def spooled_from_path(path: str) -> SpooledUpload:
+    """Describe a PDF already on disk (e.g. a batch manifest entry) like a spooled upload."""
+    digest = await asyncio.to_thread(_file_sha256, path)
+    return SpooledUpload(os.path.basename(path), path, digest, os.path.getsize(path))
+
+
+def discard(uploads):
+    """Delete spooled upload files, ignoring ones that are already gone."""
+    for upload in uploads:
+        try:
+            os.unlink(upload.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,157 @@
+"""
+Startup warm-up, readiness state and the import-time report.
+
+main.py imports this module first so cold-start timings cover its other
+imports. Heavy extraction dependencies are loaded here in the background
+after the app starts serving /health, and /ready turns green once done.
+
+    python warmup.py --target-ms 1500
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from typing import Tuple
+
+# Set WARMUP_ENABLED=0 to skip warm-up (heavy modules then load on first use)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+# Keep /ready failing while tesseract or poppler are missing from PATH
+READY_REQUIRE_OCR = os.getenv("READY_REQUIRE_OCR", "1") == "1"
+# Cold-start budget for importing main.py, in milliseconds
+STARTUP_TARGET_MS = float(os.getenv("STARTUP_TARGET_MS", "1500"))
+_DEFERRED_MARKER = "--- deferred imports ---\n"
+
+_started = time.perf_counter()
+_state = {
+    "warm": False,
+    "main_import_ms": None,
+    "startup_ms": None,
+    "steps_ms": {},
+    "imports_ms": {},
+    "ocr_binaries": {},
+    "errors": []
+}
+
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 2)
+
+
+def mark_imported():
+    """Record how long main.py took to import (call right after its imports)."""
+    _state["main_import_ms"] = _elapsed_ms(_started)
+
+
+async def _run_step(name: str, step):
+    started = time.perf_counter()
+    try:
+        result = step()
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+    except Exception as e:
+        _state["errors"].append(f"{name}: {e}")
+        return None
+    finally:
+        _state["steps_ms"][name] = _elapsed_ms(started)
+
+
+async def warm_up():
+    """
+    Check the OCR binaries, prime the OCR pool, import the heavy extraction
+    modules in a worker thread and open the vector index, the cache and the
+    duplicate index, then mark the app as warm.
+    Meant to run as a background task started from the FastAPI lifespan.
+    """
+    if WARMUP_ENABLED:
+        from pdf_text_extractor import load_extraction_modules, find_ocr_binaries
+        from ocr_executor import prime_extraction_pool
+        from faiss_store import get_index
+        from cache import open_cache
+        from duplicate_index import open_duplicate_index
+
+        # Prime the pool before importing in a worker thread: a fork during another
+        # thread's import can leave the child stuck on the inherited import lock
+        _state["ocr_binaries"] = await _run_step("ocr_binaries", find_ocr_binaries) or {}
+        await _run_step("extraction_pool", prime_extraction_pool)
+        imports = await _run_step("imports", lambda: asyncio.to_thread(load_extraction_modules))
+        _state["imports_ms"] = imports or {}
+        await _run_step("vector_index", lambda: asyncio.to_thread(get_index))
+        await _run_step("cache", lambda: asyncio.to_thread(open_cache))
+        await _run_step("duplicate_index", lambda: asyncio.to_thread(open_duplicate_index))
+    _state["warm"] = True
+    _state["startup_ms"] = _elapsed_ms(_started)
+
+
+def readiness() -> Tuple[bool, dict]:
+    """Whether the app should receive traffic, with the reasons and warm-up timings."""
+    reasons = []
+    if not _state["warm"]:
+        reasons.append("warming up")
+    reasons.extend(_state["errors"])
+    if READY_REQUIRE_OCR and _state["warm"] and WARMUP_ENABLED:
+        reasons.extend(f"{name} not found on PATH"
+                       for name, path in _state["ocr_binaries"].items() if not path)
+    ready = not reasons
+    return ready, {"status": "ready" if ready else "not_ready", "reasons": reasons,
+                   "startup_target_ms": STARTUP_TARGET_MS, **_state}
+
+
+def import_time_report(top: int = 15) -> dict:
+    """
+    Import main.py in a fresh interpreter with -X importtime and return its
+    import time, the slowest modules it imports directly, and the modules
+    deferred to warm-up.
+    """
+    code = ("import sys, json, main, pdf_text_extractor; "
+            f"sys.stderr.write({_DEFERRED_MARKER!r}); "
+            "print(json.dumps(pdf_text_extractor.load_extraction_modules()))")
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall_ms = _elapsed_ms(started)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    deferred = json.loads(proc.stdout.strip().splitlines()[-1])
+    # A module's nested imports are listed (indented) before the module itself
+    children, modules, total_ms = [], [], 0.0
+    for line in proc.stderr.partition(_DEFERRED_MARKER)[0].splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip(), int(cumulative) / 1000))
+        elif depth == 0:
+            if name.strip() == "main":
+                modules, total_ms = children, round(int(cumulative) / 1000, 2)
+            children = []
+    return {
+        "main_import_ms": total_ms,
+        "target_ms": STARTUP_TARGET_MS,
+        "within_target": total_ms <= STARTUP_TARGET_MS,
+        "interpreter_wall_ms": wall_ms,
+        "slowest_imports_ms": {name: round(ms, 2) for name, ms in
+                               sorted(modules, key=lambda item: -item[1])[:top]},
+        "deferred_to_warmup_ms": deferred
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time report for main.py")
+    parser.add_argument("--target-ms", type=float, default=STARTUP_TARGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    STARTUP_TARGET_MS = args.target_ms
+    report = import_time_report(args.top)
+    print(json.dumps(report, indent=2))
+    if not report["within_target"]:
+        print(f"[Warmup] Importing main.py took {report['main_import_ms']} ms, "
+              f"over the {STARTUP_TARGET_MS:g} ms target")
+        sys.exit(1)